@@ -1,225 +1,340 @@
 import pandas as pd
 import numpy as np
 from fund.data_fetcher import get_shanghai_volume_data
-import matplotlib.pyplot as plt
 from datetime import datetime
+from numba import njit
 
-# 设置matplotlib中文字体
-plt.rcParams['font.sans-serif'] = ['Heiti TC', 'Arial Unicode MS', 'STHeiti', 'SimHei']
-plt.rcParams['axes.unicode_minus'] = False
 
+@njit(cache=True)
+def _rolling_rank_incremental(arr: np.ndarray, window: int) -> np.ndarray:
+    """
+    滚动窗口内当前值的百分位排名（窗口内 <= 当前值的占比）
+    先把数值映射为全局排名，再用树状数组维护窗口内各排名的计数，
+    每步的加入、移出和查询都是 O(log N)
+    :param arr: 数值序列
+    :param window: 窗口长度，不足时使用全部已有数据
+    :return: 百分位数组，首个数据点为0
+    """
+    n = arr.shape[0]
+    out = np.zeros(n)
+    # 全局排名（1..n），相同数值映射到同一排名
+    bins = np.searchsorted(np.sort(arr), arr, side='right')
+    bit = np.zeros(n + 1, np.int32)
+    for i in range(n):
+        k = bins[i]
+        while k <= n:
+            bit[k] += 1
+            k += k & -k
+        if i >= window:
+            k = bins[i - window]
+            while k <= n:
+                bit[k] -= 1
+                k += k & -k
+        if i == 0:
+            continue
+        count = 0
+        k = bins[i]
+        while k > 0:
+            count += bit[k]
+            k -= k & -k
+        out[i] = count / min(i + 1, window) * 100
+    return out
 
-def advanced_timing_strategy_backtest(start_date: str = "2015-01-01", end_date: str = None):
+
+@njit(cache=True, fastmath=True)
+def _triple_sma(x: np.ndarray, w1: int, w2: int, w3: int):
     """
-    改进版择时策略：
-    1. 估值择时：PE百分位 < 30% 时加大投入
-    2. 趋势择时：MA250上方正常投入，下方减少投入  
-    3. 情绪择时：成交额百分位 < 20% 时抄底，> 95% 时止盈
-    4. 动态仓位：根据多个指标综合决定仓位
+    单次遍历同时计算三条简单移动平均线（滚动求和：加入新值、减去移出值）
+    :param x: 价格序列
+    :param w1: 第一条均线窗口
+    :param w2: 第二条均线窗口
+    :param w3: 第三条均线窗口
+    :return: (ma1, ma2, ma3)，数据不足窗口长度的位置为NaN
     """
-    # 获取数据
-    df = get_shanghai_volume_data(start_date=start_date, end_date=end_date)
-    if df.empty:
-        print("无法获取数据")
-        return
-    
-    # 数据预处理
-    df['日期'] = pd.to_datetime(df['日期'])
-    df = df.sort_values('日期').reset_index(drop=True)
-    
-    # 计算技术指标
-    df['MA20'] = df['收盘'].rolling(20).mean()
-    df['MA60'] = df['收盘'].rolling(60).mean()
-    df['MA250'] = df['收盘'].rolling(250).mean()
-    
-    # 计算估值百分位（这里用价格代替，实际应该用PE）
-    df['价格百分位'] = 0.0
-    window_size = 252 * 2  # 2年窗口
-    
-    for i in range(len(df)):
-        if i < window_size:
-            historical_data = df['收盘'][:i+1]
-        else:
-            historical_data = df['收盘'][i-window_size+1:i+1]
-        
-        if len(historical_data) > 1:
-            current_value = df['收盘'].iloc[i]
-            percentile = np.sum(historical_data <= current_value) / len(historical_data) * 100
-            df.at[i, '价格百分位'] = percentile
-    
-    # 计算成交额百分位
-    df['成交额_百分位'] = 0.0
-    for i in range(len(df)):
-        if i < window_size:
-            historical_data = df['成交额'][:i+1]
-        else:
-            historical_data = df['成交额'][i-window_size+1:i+1]
-        
-        if len(historical_data) > 1:
-            current_value = df['成交额'].iloc[i]
-            percentile = np.sum(historical_data <= current_value) / len(historical_data) * 100
-            df.at[i, '成交额_百分位'] = percentile
-    
-    # 初始化变量
-    cash = 0
-    shares = 0
-    total_invested = 0
-    profit_pool = 0
+    n = x.shape[0]
+    ma1 = np.empty(n)
+    ma2 = np.empty(n)
+    ma3 = np.empty(n)
+    s1 = 0.0
+    s2 = 0.0
+    s3 = 0.0
+    for i in range(n):
+        v = x[i]
+        s1 += v
+        s2 += v
+        s3 += v
+        if i >= w1:
+            s1 -= x[i - w1]
+        if i >= w2:
+            s2 -= x[i - w2]
+        if i >= w3:
+            s3 -= x[i - w3]
+        ma1[i] = s1 / w1 if i >= w1 - 1 else np.nan
+        ma2[i] = s2 / w2 if i >= w2 - 1 else np.nan
+        ma3[i] = s3 / w3 if i >= w3 - 1 else np.nan
+    return ma1, ma2, ma3
+
+
+# 交易操作编码
+_OP_BUY = 0
+_OP_AGGRESSIVE_TAKE_PROFIT = 1
+_OP_SIGNAL_TAKE_PROFIT = 2
+_OP_NAMES = ('买入', '激进止盈', '信号止盈')
+_SIGNAL_NAMES = ('trend', 'valuation', 'sentiment', 'momentum')
+
+
+@njit(cache=True, fastmath=True)
+def _run_backtest(prices, ma20, ma60, ma250, ppct, vpct, trade_days):
+    """
+    多因子择时策略的状态机，只遍历交易日
+    :param prices: 收盘价
+    :param ma20: 20日均线
+    :param ma60: 60日均线
+    :param ma250: 250日均线
+    :param ppct: 价格百分位
+    :param vpct: 成交额百分位
+    :param trade_days: 交易日下标（每月首日且MA250有效）
+    :return: 各交易日交易后的现金/持股/资金池，交易记录各列数组，以及累计工资投入
+    """
+    n = trade_days.shape[0]
+    cash_after = np.empty(n)
+    shares_after = np.empty(n)
+    pool_after = np.empty(n)
     
-    trades = []
-    portfolio_value = []
+    # 每个交易日最多一笔止盈加一笔买入
+    trade_idx = np.empty(2 * n, np.int64)
+    trade_op = np.empty(2 * n, np.int8)
+    trade_qty = np.empty(2 * n)
+    trade_amt = np.empty(2 * n)
+    trade_salary = np.zeros(2 * n)
+    trade_score = np.empty(2 * n, np.int8)
+    trade_signals = np.empty((2 * n, 4), np.int8)
+    k = 0
     
-    # 获取每月首个交易日
-    df['年月'] = df['日期'].dt.to_period('M')
-    monthly_first_days = df.groupby('年月')['日期'].first().reset_index()
-    monthly_first_days['是月初'] = True
-    df = df.merge(monthly_first_days[['日期', '是月初']], on='日期', how='left')
-    df['是月初'] = df['是月初'].fillna(False)
+    cash = 0.0
+    shares = 0.0
+    total_invested = 0.0
+    profit_pool = 0.0
     
-    for idx, row in df.iterrows():
-        date = row['日期']
-        price = row['收盘']
-        ma20 = row['MA20']
-        ma60 = row['MA60'] 
-        ma250 = row['MA250']
-        price_percentile = row['价格百分位']
-        volume_percentile = row['成交额_百分位']
-        is_first_day = row['是月初']
-        
-        # 计算当前组合价值
-        current_portfolio_value = cash + shares * price + profit_pool
-        portfolio_value.append({
-            '日期': date,
-            '现金': cash,
-            '持股数量': shares,
-            '股票价值': shares * price,
-            '止盈资金池': profit_pool,
-            '组合总价值': current_portfolio_value,
-            '价格百分位': price_percentile,
-            '成交额百分位': volume_percentile,
-            'MA20': ma20,
-            'MA250': ma250
-        })
-        
-        # 只在每月首日进行交易
-        if not is_first_day or pd.isna(ma250):
-            continue
+    for t in range(n):
+        i = trade_days[t]
+        price = prices[i]
         
         # 计算收益率
         if total_invested > 0:
             current_return_rate = ((shares * price + profit_pool) - total_invested) / total_invested
         else:
-            current_return_rate = 0
+            current_return_rate = 0.0
         
-        # 多因子择时策略
-        signals = {
-            'trend': 1 if price > ma250 else -1,  # 趋势信号
-            'valuation': 1 if price_percentile < 30 else (-1 if price_percentile > 80 else 0),  # 估值信号
-            'sentiment': 1 if volume_percentile < 20 else (-1 if volume_percentile > 95 else 0),  # 情绪信号
-            'momentum': 1 if price > ma20 > ma60 else (-1 if price < ma20 < ma60 else 0)  # 动量信号
-        }
+        # 多因子择时信号
+        trend = 1 if price > ma250[i] else -1
+        valuation = 1 if ppct[i] < 30 else (-1 if ppct[i] > 80 else 0)
+        sentiment = 1 if vpct[i] < 20 else (-1 if vpct[i] > 95 else 0)
+        if price > ma20[i] and ma20[i] > ma60[i]:
+            momentum = 1
+        elif price < ma20[i] and ma20[i] < ma60[i]:
+            momentum = -1
+        else:
+            momentum = 0
         
         # 综合信号得分 (-4 到 +4)
-        total_signal = sum(signals.values())
+        total_signal = trend + valuation + sentiment + momentum
         
         # 止盈操作
-        sell_action = ""
-        if volume_percentile > 98 and current_return_rate > 0.3 and shares > 0:
-            sell_shares = shares * 0.3  # 激进止盈
-            sell_amount = sell_shares * price
-            shares -= sell_shares
-            profit_pool += sell_amount
-            sell_action = f"激进止盈 {sell_shares:.2f}股，获得 {sell_amount:.2f}元"
-            
-            trades.append({
-                '日期': date,
-                '操作': '激进止盈',
-                '价格': price,
-                '数量': sell_shares,
-                '金额': sell_amount,
-                '信号得分': total_signal,
-                '综合信号': signals
-            })
+        sell_op = -1
+        sell_shares = 0.0
+        if vpct[i] > 98 and current_return_rate > 0.3 and shares > 0:
+            sell_op = _OP_AGGRESSIVE_TAKE_PROFIT
+            sell_shares = shares * 0.3
+        elif vpct[i] > 90 and total_signal <= -2 and shares > 0:
+            sell_op = _OP_SIGNAL_TAKE_PROFIT
+            sell_shares = shares * 0.2
         
-        elif volume_percentile > 90 and total_signal <= -2 and shares > 0:
-            sell_shares = shares * 0.2  # 信号止盈
+        if sell_op >= 0:
             sell_amount = sell_shares * price
             shares -= sell_shares
             profit_pool += sell_amount
-            sell_action = f"信号止盈 {sell_shares:.2f}股，获得 {sell_amount:.2f}元"
             
-            trades.append({
-                '日期': date,
-                '操作': '信号止盈',
-                '价格': price,
-                '数量': sell_shares,
-                '金额': sell_amount,
-                '信号得分': total_signal,
-                '综合信号': signals
-            })
+            trade_idx[k] = i
+            trade_op[k] = sell_op
+            trade_qty[k] = sell_shares
+            trade_amt[k] = sell_amount
+            trade_score[k] = total_signal
+            trade_signals[k, 0] = trend
+            trade_signals[k, 1] = valuation
+            trade_signals[k, 2] = sentiment
+            trade_signals[k, 3] = momentum
+            k += 1
         
         # 根据信号强度决定投入金额
         if total_signal >= 3:  # 极强买入信号
             if profit_pool >= 15000:
-                investment_amount = 15000
+                investment_amount = 15000.0
                 profit_pool -= 15000
-                salary_used = 0
-                fund_source = "止盈资金池"
+                salary_used = 0.0
             else:
-                investment_amount = 8000  # 工资加大投入
-                salary_used = 8000
-                fund_source = "工资"
-        
+                investment_amount = 8000.0  # 工资加大投入
+                salary_used = 8000.0
         elif total_signal >= 1:  # 偏多信号
             if profit_pool >= 8000:
-                pool_amount = min(profit_pool, 8000)
-                salary_amount = 5000
-                investment_amount = pool_amount + salary_amount
+                pool_amount = min(profit_pool, 8000.0)
+                salary_used = 5000.0
+                investment_amount = pool_amount + salary_used
                 profit_pool -= pool_amount
-                salary_used = salary_amount
-                fund_source = f"资金池{pool_amount:.0f}元+工资{salary_amount:.0f}元"
             else:
-                investment_amount = 6000
-                salary_used = 6000
-                fund_source = "工资"
-        
+                investment_amount = 6000.0
+                salary_used = 6000.0
         elif total_signal >= -1:  # 中性信号
-            investment_amount = 5000
-            salary_used = 5000
-            fund_source = "工资"
-        
+            investment_amount = 5000.0
+            salary_used = 5000.0
         else:  # 偏空信号
-            investment_amount = 2000  # 大幅减少投入
-            salary_used = 2000
-            fund_source = "工资"
+            investment_amount = 2000.0  # 大幅减少投入
+            salary_used = 2000.0
         
         # 执行买入
-        if investment_amount > 0:
-            buy_shares = investment_amount / price
-            shares += buy_shares
-            total_invested += salary_used
-            
-            buy_action = f"买入 {buy_shares:.2f}股，投入 {investment_amount}元 ({fund_source})"
+        buy_shares = investment_amount / price
+        shares += buy_shares
+        total_invested += salary_used
+        
+        trade_idx[k] = i
+        trade_op[k] = _OP_BUY
+        trade_qty[k] = buy_shares
+        trade_amt[k] = investment_amount
+        trade_salary[k] = salary_used
+        trade_score[k] = total_signal
+        trade_signals[k, 0] = trend
+        trade_signals[k, 1] = valuation
+        trade_signals[k, 2] = sentiment
+        trade_signals[k, 3] = momentum
+        k += 1
+        
+        # 记录交易后的组合状态
+        cash_after[t] = cash
+        shares_after[t] = shares
+        pool_after[t] = profit_pool
+    
+    return (cash_after, shares_after, pool_after, trade_idx[:k], trade_op[:k], trade_qty[:k],
+            trade_amt[:k], trade_salary[:k], trade_score[:k], trade_signals[:k], total_invested)
+
+
+def advanced_timing_strategy_backtest(start_date: str = "2015-01-01", end_date: str = None):
+    """
+    改进版择时策略：
+    1. 估值择时：PE百分位 < 30% 时加大投入
+    2. 趋势择时：MA250上方正常投入，下方减少投入  
+    3. 情绪择时：成交额百分位 < 20% 时抄底，> 95% 时止盈
+    4. 动态仓位：根据多个指标综合决定仓位
+    """
+    # 获取数据
+    df = get_shanghai_volume_data(start_date=start_date, end_date=end_date)
+    if df.empty:
+        print("无法获取数据")
+        return
+    
+    # 数据预处理
+    df['日期'] = pd.to_datetime(df['日期'])
+    df = df.sort_values('日期').reset_index(drop=True)
+    
+    # 计算技术指标
+    close = df['收盘'].to_numpy(np.float64)
+    df['MA20'], df['MA60'], df['MA250'] = _triple_sma(close, 20, 60, 250)
+    
+    # 计算估值百分位（这里用价格代替，实际应该用PE）
+    window_size = 252 * 2  # 2年窗口
+    amt = df['成交额'].to_numpy(np.float64)
+    df['价格百分位'] = _rolling_rank_incremental(close, window_size)
+    
+    # 计算成交额百分位
+    df['成交额_百分位'] = _rolling_rank_incremental(amt, window_size)
+    
+    # 获取每月首个交易日
+    months = (df['日期'].dt.year * 12 + df['日期'].dt.month).to_numpy()
+    is_first = np.empty(len(months), bool)
+    is_first[0] = True
+    is_first[1:] = months[1:] != months[:-1]
+    df['是月初'] = is_first
+    
+    # 循环前一次性取出所需列，避免逐行构造Series
+    dates = df['日期'].to_numpy()
+    prices = df['收盘'].to_numpy(np.float64)
+    ma20_arr = df['MA20'].to_numpy()
+    ma60_arr = df['MA60'].to_numpy()
+    ma250_arr = df['MA250'].to_numpy()
+    ppct = df['价格百分位'].to_numpy()
+    vpct = df['成交额_百分位'].to_numpy()
+    
+    # 只在每月首日且MA250有效时交易
+    trade_day = is_first & ~np.isnan(ma250_arr)
+    trade_days = np.flatnonzero(trade_day)
+    
+    (cash_after, shares_after, pool_after, trade_idx, trade_op, trade_qty, trade_amt,
+     trade_salary, trade_score, trade_signals, total_invested) = _run_backtest(
+        prices, ma20_arr, ma60_arr, ma250_arr, ppct, vpct, trade_days)
+    
+    # 两个交易日之间组合状态不变，按区间长度展开为每日状态（交易当日记录的是交易前状态）
+    seg_len = np.diff(np.concatenate(([0], trade_days + 1, [len(df)])))
+    cash_arr = np.repeat(np.concatenate(([0.0], cash_after)), seg_len)
+    shares_arr = np.repeat(np.concatenate(([0.0], shares_after)), seg_len)
+    pool_arr = np.repeat(np.concatenate(([0.0], pool_after)), seg_len)
+    
+    # 还原交易记录并打印交易信息
+    trades = []
+    for k in range(len(trade_idx)):
+        i = trade_idx[k]
+        date = pd.Timestamp(dates[i])
+        date_str = date.strftime('%Y-%m-%d')
+        operation = _OP_NAMES[trade_op[k]]
+        total_signal = int(trade_score[k])
+        signals = dict(zip(_SIGNAL_NAMES, trade_signals[k].tolist()))
+        
+        if trade_op[k] == _OP_BUY:
+            salary_used = trade_salary[k]
+            pool_amount = trade_amt[k] - salary_used
+            if salary_used == 0:
+                fund_source = "止盈资金池"
+            elif pool_amount > 0:
+                fund_source = f"资金池{pool_amount:.0f}元+工资{salary_used:.0f}元"
+            else:
+                fund_source = "工资"
             
             trades.append({
                 '日期': date,
-                '操作': '买入',
-                '价格': price,
-                '数量': buy_shares,
-                '金额': investment_amount,
+                '操作': operation,
+                '价格': prices[i],
+                '数量': trade_qty[k],
+                '金额': trade_amt[k],
                 '工资投入': salary_used,
                 '信号得分': total_signal,
                 '综合信号': signals,
                 '资金来源': fund_source
             })
-            
-            # 打印交易信息
-            if sell_action:
-                print(f"{date.strftime('%Y-%m-%d')}: {sell_action}")
-            print(f"{date.strftime('%Y-%m-%d')}: {buy_action}, 信号: {total_signal}")
+            print(f"{date_str}: 买入 {trade_qty[k]:.2f}股，投入 {trade_amt[k]:.0f}元 ({fund_source}), 信号: {total_signal}")
+        else:
+            trades.append({
+                '日期': date,
+                '操作': operation,
+                '价格': prices[i],
+                '数量': trade_qty[k],
+                '金额': trade_amt[k],
+                '信号得分': total_signal,
+                '综合信号': signals
+            })
+            print(f"{date_str}: {operation} {trade_qty[k]:.2f}股，获得 {trade_amt[k]:.2f}元")
     
     # 转换为DataFrame
-    portfolio_df = pd.DataFrame(portfolio_value)
+    stock_val_arr = shares_arr * prices
+    portfolio_df = pd.DataFrame({
+        '日期': dates,
+        '现金': cash_arr,
+        '持股数量': shares_arr,
+        '股票价值': stock_val_arr,
+        '止盈资金池': pool_arr,
+        '组合总价值': cash_arr + stock_val_arr + pool_arr,
+        '价格百分位': ppct,
+        '成交额百分位': vpct,
+        'MA20': ma20_arr,
+        'MA250': ma250_arr
+    })
     trades_df = pd.DataFrame(trades) if trades else pd.DataFrame()
     
     # 计算最终收益
@@ -227,14 +342,10 @@ def advanced_timing_strategy_backtest(start_date: str = "2015-01-01", end_date:
     strategy_return = (final_portfolio_value - total_invested) / total_invested * 100
     
     # 计算基准收益（固定定投5000元）
-    fixed_investment_value = 0
-    fixed_total_invested = 0
-    for _, row in df.iterrows():
-        if row['是月初'] and not pd.isna(row['MA250']):
-            fixed_total_invested += 5000
-            fixed_investment_value += 5000 / row['收盘']
+    fixed_total_invested = 5000 * int(trade_day.sum())
+    fixed_investment_value = (5000 / prices[trade_day]).sum()
     
-    fixed_final_value = fixed_investment_value * df['收盘'].iloc[-1]
+    fixed_final_value = fixed_investment_value * prices[-1]
     fixed_return = (fixed_final_value - fixed_total_invested) / fixed_total_invested * 100
     
     # 打印结果
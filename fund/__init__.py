@@ -1,6 +1,6 @@
-from .data_fetcher import get_fund_nav_by_date, get_shanghai_volume_data
+from .data_fetcher import get_fund_nav_by_date, get_fund_names, get_shanghai_volume_data
 from .drawdown_analyzer import analyze_drawdown_strategy
 from .visualization import plot_drawdown_hist, plot_fund_price_change_distribution, plot_shanghai_volume_trend
-from .notification import send_drawdown_analysis
+from .notification import send_drawdown_analysis, send_drawdown_analysis_batch
 
-__all__ = ['get_fund_nav_by_date', 'get_shanghai_volume_data', 'analyze_drawdown_strategy', 'plot_drawdown_hist', 'plot_fund_price_change_distribution', 'plot_shanghai_volume_trend', 'send_drawdown_analysis']
\ No newline at end of file
+__all__ = ['get_fund_nav_by_date', 'get_fund_names', 'get_shanghai_volume_data', 'analyze_drawdown_strategy', 'plot_drawdown_hist', 'plot_fund_price_change_distribution', 'plot_shanghai_volume_trend', 'send_drawdown_analysis', 'send_drawdown_analysis_batch']
\ No newline at end of file
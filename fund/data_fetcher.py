@@ -1,9 +1,83 @@
 import akshare as ak
 import pandas as pd
 import os
-import json
-import glob
+import orjson
+import tempfile
+import threading
 from datetime import datetime
+from typing import Optional
+
+
+# 全部基金名称表，每个进程只向akshare请求一次
+_FUND_NAME_CACHE: Optional[pd.DataFrame] = None
+# 基金代码 -> 基金简称
+_FUND_NAME_INDEX: Optional[dict] = None
+# 多线程同时首次调用时只让一个线程下载名称表
+_FUND_NAME_LOCK = threading.Lock()
+
+
+def _get_fund_name_table() -> pd.DataFrame:
+    """
+    获取全部基金名称表，首次调用时查询并缓存，之后直接返回缓存
+    :return: akshare返回的基金名称表
+    """
+    global _FUND_NAME_CACHE, _FUND_NAME_INDEX
+    if _FUND_NAME_CACHE is None:
+        with _FUND_NAME_LOCK:
+            if _FUND_NAME_CACHE is None:
+                fund_name_info = ak.fund_name_em()
+                _FUND_NAME_INDEX = dict(zip(fund_name_info['基金代码'], fund_name_info['基金简称']))
+                _FUND_NAME_CACHE = fund_name_info
+    return _FUND_NAME_CACHE
+
+
+_MAPPING_FILE = "data/fund_mapping.json"
+# 基金映射文件的进程内缓存，文件修改时间变化时才重新读取
+_MAPPING_CACHE = {'mtime': 0.0, 'data': None}
+# 映射的读取、补全和保存需作为整体进行，避免多线程互相覆盖或丢失新增条目
+_MAPPING_LOCK = threading.RLock()
+
+
+def _load_mapping() -> dict:
+    """
+    读取基金映射文件，文件未修改时直接返回缓存
+    :return: 基金代码到基金名称的映射（缓存对象本身）
+    """
+    try:
+        mtime = os.path.getmtime(_MAPPING_FILE)
+    except OSError:
+        mtime = None
+    
+    if mtime is not None and (_MAPPING_CACHE['data'] is None or mtime != _MAPPING_CACHE['mtime']):
+        try:
+            with open(_MAPPING_FILE, 'rb') as f:
+                _MAPPING_CACHE['data'] = orjson.loads(f.read())
+            _MAPPING_CACHE['mtime'] = mtime
+        except Exception as e:
+            print(f"读取基金映射文件失败: {e}")
+    
+    if _MAPPING_CACHE['data'] is None:
+        _MAPPING_CACHE['data'] = {}
+    return _MAPPING_CACHE['data']
+
+
+def _save_mapping(fund_mapping: dict):
+    """
+    原子写入基金映射文件（先写临时文件再替换），避免其他进程读到半个文件
+    :param fund_mapping: 基金代码到基金名称的映射
+    """
+    mapping_dir = os.path.dirname(_MAPPING_FILE)
+    os.makedirs(mapping_dir, exist_ok=True)
+    fd, tmp_file = tempfile.mkstemp(dir=mapping_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(orjson.dumps(fund_mapping, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        os.replace(tmp_file, _MAPPING_FILE)
+    except Exception:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+    _MAPPING_CACHE['mtime'] = os.path.getmtime(_MAPPING_FILE)
 
 
 def update_fund_mapping(fund_code: str, fund_name: str = None):
@@ -12,52 +86,117 @@ def update_fund_mapping(fund_code: str, fund_name: str = None):
     :param fund_code: 基金代码
     :param fund_name: 基金名称，如果为None则尝试查询
     """
-    mapping_file = "data/fund_mapping.json"
-    
-    # 读取现有映射
-    fund_mapping = {}
-    if os.path.exists(mapping_file):
-        try:
-            with open(mapping_file, 'r', encoding='utf-8') as f:
-                fund_mapping = json.load(f)
-        except Exception:
-            pass
-    
-    # 如果映射中已存在，跳过
-    if fund_code in fund_mapping:
-        return fund_mapping[fund_code]
+    with _MAPPING_LOCK:
+        # 读取现有映射
+        fund_mapping = _load_mapping()
+        
+        # 如果映射中已存在，跳过
+        if fund_code in fund_mapping:
+            return fund_mapping[fund_code]
+        
+        # 如果没有提供基金名称，尝试查询
+        if fund_name is None:
+            try:
+                _get_fund_name_table()
+                fund_name = _FUND_NAME_INDEX.get(fund_code)
+            
+                if fund_name:
+                    print(f"查询到基金名称: {fund_name}")
+            except Exception as e:
+                print(f"查询基金{fund_code}名称失败: {e}")
+                return fund_code
+        
+        # 更新映射并保存
+        if fund_name and fund_name != fund_code:
+            fund_mapping[fund_code] = fund_name
+            try:
+                _save_mapping(fund_mapping)
+                print(f"已将{fund_code}:{fund_name}保存到映射文件")
+            except Exception as e:
+                print(f"保存映射文件失败: {e}")
+            return fund_name
+        
+        return fund_code
+
+
+def get_fund_names(fund_codes: list) -> dict:
+    """
+    批量获取基金名称：基金名称表最多加载一次，映射中缺少的基金一次补全并写入映射文件
+    批量推送前调用，可避免后续各线程重复查询名称表、并发写映射文件
+    :param fund_codes: 基金代码列表
+    :return: 基金代码 -> 基金名称（查询不到时为基金代码本身）
+    """
+    with _MAPPING_LOCK:
+        fund_mapping = _load_mapping()
+        missing = [fund_code for fund_code in fund_codes if fund_code not in fund_mapping]
+        
+        if missing:
+            try:
+                _get_fund_name_table()
+                found = {fund_code: _FUND_NAME_INDEX[fund_code] for fund_code in missing
+                         if _FUND_NAME_INDEX.get(fund_code) and _FUND_NAME_INDEX[fund_code] != fund_code}
+            except Exception as e:
+                print(f"查询基金名称表失败: {e}")
+                found = {}
+        
+            if found:
+                fund_mapping.update(found)
+                try:
+                    _save_mapping(fund_mapping)
+                    print(f"已将{len(found)}个基金名称保存到映射文件")
+                except Exception as e:
+                    print(f"保存映射文件失败: {e}")
+        
+        return {fund_code: fund_mapping.get(fund_code, fund_code) for fund_code in fund_codes}
+
+
+def _remove_old_caches(prefix: str, suffixes: tuple, keep: tuple):
+    """
+    单次扫描data目录，删除同一基金的旧日期缓存文件
+    :param prefix: 缓存文件名前缀
+    :param suffixes: 缓存文件名后缀
+    :param keep: 需要保留的文件名（当前日期的缓存）
+    """
+    try:
+        with os.scandir('data') as it:
+            old_files = [entry.path for entry in it
+                         if entry.name.startswith(prefix) and entry.name.endswith(suffixes) and entry.name not in keep]
+    except FileNotFoundError:
+        return
     
-    # 如果没有提供基金名称，尝试查询
-    if fund_name is None:
+    for old_file in old_files:
         try:
-            fund_name_info = ak.fund_name_em()
-            matching_funds = fund_name_info[fund_name_info['基金代码'] == fund_code]
-            
-            if not matching_funds.empty:
-                fund_name = matching_funds.iloc[0]['基金简称']
-                print(f"查询到基金名称: {fund_name}")
+            os.remove(old_file)
+            print(f"删除旧缓存文件: {old_file}")
         except Exception as e:
-            print(f"查询基金{fund_code}名称失败: {e}")
-            return fund_code
+            print(f"删除旧缓存文件{old_file}失败: {e}")
+
+
+def _read_cache(cache_file: str, legacy_file: str) -> Optional[pd.DataFrame]:
+    """
+    读取parquet缓存；若只有旧版json缓存，则读取后一次性迁移为parquet
+    :param cache_file: parquet缓存文件路径
+    :param legacy_file: 旧版json缓存文件路径
+    :return: 缓存数据，无缓存时返回None
+    """
+    if os.path.exists(cache_file):
+        return pd.read_parquet(cache_file)
     
-    # 更新映射并保存
-    if fund_name and fund_name != fund_code:
-        fund_mapping[fund_code] = fund_name
+    if os.path.exists(legacy_file):
+        df = pd.read_json(legacy_file, orient='records')
         try:
-            os.makedirs(os.path.dirname(mapping_file), exist_ok=True)
-            with open(mapping_file, 'w', encoding='utf-8') as f:
-                json.dump(fund_mapping, f, ensure_ascii=False, indent=2)
-            print(f"已将{fund_code}:{fund_name}保存到映射文件")
+            df.to_parquet(cache_file, compression='zstd')
+            os.remove(legacy_file)
         except Exception as e:
-            print(f"保存映射文件失败: {e}")
-        return fund_name
+            print(f"迁移旧缓存{legacy_file}失败: {e}")
+        return df
     
-    return fund_code
+    return None
 
 
 def get_fund_nav_by_date(fund_code: str, date_str: str = None) -> pd.DataFrame:
     """
-    优先从本地json缓存读取基金净值数据，如无则用akshare获取并缓存。
+    优先从本地parquet缓存读取基金净值数据，如无则用akshare获取并缓存。
     只获取累计净值走势数据（考虑分红再投资）。
     :param fund_code: 基金代码，如 '110022'
     :param date_str: 日期字符串，格式为 'YYYY-MM-DD'，如果为None则使用今日
@@ -66,29 +205,21 @@ def get_fund_nav_by_date(fund_code: str, date_str: str = None) -> pd.DataFrame:
     if date_str is None:
         date_str = datetime.now().strftime('%Y-%m-%d')
     
-    cache_file = f"data/fund_{fund_code}_{date_str}_cumulative.json"
+    cache_file = f"data/fund_{fund_code}_{date_str}_cumulative.parquet"
+    legacy_cache_file = f"data/fund_{fund_code}_{date_str}_cumulative.json"
     # 优先尝试读取本地缓存
-    if os.path.exists(cache_file):
-        try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            df = pd.DataFrame(data)
-            if not df.empty and '累计净值' in df.columns:
-                # 即使使用缓存，也尝试更新基金映射（如果映射不存在）
-                update_fund_mapping(fund_code)
-                return df
-        except Exception as e:
-            print(f"读取本地缓存{cache_file}失败: {e}")
+    try:
+        df = _read_cache(cache_file, legacy_cache_file)
+        if df is not None and not df.empty and '累计净值' in df.columns:
+            # 即使使用缓存，也尝试更新基金映射（如果映射不存在）
+            update_fund_mapping(fund_code)
+            return df
+    except Exception as e:
+        print(f"读取本地缓存{cache_file}失败: {e}")
     
-    # 删除该基金的旧日期缓存文件
-    old_cache_pattern = f"data/fund_{fund_code}_*_cumulative.json"
-    for old_file in glob.glob(old_cache_pattern):
-        if old_file != cache_file:  # 不删除当前日期的文件
-            try:
-                os.remove(old_file)
-                print(f"删除旧缓存文件: {old_file}")
-            except Exception as e:
-                print(f"删除旧缓存文件{old_file}失败: {e}")
+    # 缓存未命中时才删除该基金的旧日期缓存文件（包括旧版json缓存）
+    _remove_old_caches(f"fund_{fund_code}_", ("_cumulative.parquet", "_cumulative.json"),
+                       (os.path.basename(cache_file), os.path.basename(legacy_cache_file)))
     
     # 本地无有效缓存，尝试akshare获取
     try:
@@ -104,7 +235,8 @@ def get_fund_nav_by_date(fund_code: str, date_str: str = None) -> pd.DataFrame:
         
         # 写入本地缓存
         try:
-            df.to_json(cache_file, orient='records', force_ascii=False)
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            df.to_parquet(cache_file, compression='zstd')
         except Exception as e:
             print(f"写入本地缓存{cache_file}失败: {e}")
         return df
@@ -128,18 +260,16 @@ def get_shanghai_volume_data(start_date: str = None, end_date: str = None) -> pd
         start_datetime = datetime.now() - pd.DateOffset(days=365)
         start_date = start_datetime.strftime('%Y-%m-%d')
     
-    cache_file = f"data/shanghai_volume_{start_date}_{end_date}.json"
+    cache_file = f"data/shanghai_volume_{start_date}_{end_date}.parquet"
+    legacy_cache_file = f"data/shanghai_volume_{start_date}_{end_date}.json"
     
     # 优先尝试读取本地缓存
-    if os.path.exists(cache_file):
-        try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            df = pd.DataFrame(data)
-            if not df.empty and '成交量' in df.columns and '成交额' in df.columns:
-                return df
-        except Exception as e:
-            print(f"读取上证成交量缓存{cache_file}失败: {e}")
+    try:
+        df = _read_cache(cache_file, legacy_cache_file)
+        if df is not None and not df.empty and '成交量' in df.columns and '成交额' in df.columns:
+            return df
+    except Exception as e:
+        print(f"读取上证成交量缓存{cache_file}失败: {e}")
     
     # 本地无有效缓存，尝试akshare获取
     try:
@@ -172,7 +302,7 @@ def get_shanghai_volume_data(start_date: str = None, end_date: str = None) -> pd
         # 写入本地缓存
         try:
             os.makedirs(os.path.dirname(cache_file), exist_ok=True)
-            df.to_json(cache_file, orient='records', force_ascii=False, date_format='iso')
+            df.to_parquet(cache_file, compression='zstd')
             print(f"上证成交量数据已缓存到: {cache_file}")
         except Exception as e:
             print(f"写入上证成交量缓存{cache_file}失败: {e}")
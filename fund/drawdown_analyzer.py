@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 from .data_fetcher import get_fund_nav_by_date
@@ -10,7 +11,7 @@ def calculate_fund_drawdown(df, fund_code: str = "", silent: bool = False, recen
     :param fund_code: 基金代码，用于提示信息
     :param silent: 是否静默模式（不打印输出）
     :param recent_days: 如果指定，则只使用最近N天的数据；如果为None则使用所有数据
-    :return: (df_to_use, drawdown) 使用的数据和回撤率序列
+    :return: (df_to_use, drawdown) 使用的数据和回撤率数组（np.ndarray）
     """
     if df.empty or '累计净值' not in df.columns or '净值日期' not in df.columns:
         raise ValueError(f"数据无效，缺少必要列")
@@ -38,54 +39,68 @@ def calculate_fund_drawdown(df, fund_code: str = "", silent: bool = False, recen
         if not silent and fund_code:
             print(f"使用基金{fund_code}所有历史数据计算回撤。")
     
-    nav = df_to_use['累计净值'].astype(float)
+    nav = df_to_use['累计净值'].to_numpy(np.float64)
     # 按照支付宝基金回撤计算方法：当前净值相对于历史最高净值的回撤
-    # 计算到当前日期为止的历史最高净值（包括当前日期）
-    running_max = nav.expanding().max()
+    # 计算到当前日期为止的历史最高净值（包括当前日期），fmax跳过缺失值
+    running_max = np.fmax.accumulate(nav)
     # 回撤率 = (历史最高净值 - 当前净值) / 历史最高净值 * 100%
     drawdown = (running_max - nav) / running_max * 100
     
     return df_to_use, drawdown
 
 
-def analyze_drawdown_strategy(fund_code: str, silent: bool = False, recent_days: int = None):
+def analyze_drawdown_strategy(fund_code: str, silent: bool = False, recent_days: int = None,
+                              df: pd.DataFrame = None, drawdown: np.ndarray = None):
     """
     分析基金回撤率统计信息，提供买入建议
     :param recent_days:
     :param fund_code: 基金代码
     :param silent: 是否静默模式（不打印输出）
+    :param df: 已获取的净值数据，为None时重新获取
+    :param drawdown: 已计算好的回撤率数组（已按recent_days截取），传入时跳过获取和计算
     """
-    df = get_fund_nav_by_date(fund_code)
-    try:
-        df_to_use, drawdown = calculate_fund_drawdown(df, fund_code, silent, recent_days)
-    except ValueError as e:
-        print(f"无法分析基金{fund_code}，{e}")
-        return
+    if drawdown is None:
+        if df is None:
+            df = get_fund_nav_by_date(fund_code)
+        try:
+            df_to_use, drawdown = calculate_fund_drawdown(df, fund_code, silent, recent_days)
+        except ValueError as e:
+            print(f"无法分析基金{fund_code}，{e}")
+            return
     
     
     # 当前回撤率
-    current_drawdown = drawdown.iloc[-1]
+    current_drawdown = drawdown[-1]
     
     # 历史回撤统计 - 使用非零回撤数据计算分位数
-    non_zero_drawdown = drawdown[drawdown > 0]
+    # 只排序一次，分位数和百分位排名都基于同一个有序数组
+    non_zero_sorted = np.sort(drawdown[drawdown > 0])
+    n_non_zero = len(non_zero_sorted)
     zero_ratio = (drawdown == 0).mean()
     
+    if n_non_zero > 0:
+        q05, q10, q25, q50, q75 = np.quantile(non_zero_sorted, [0.05, 0.10, 0.25, 0.50, 0.75])
+    else:
+        q05 = q10 = q25 = q50 = q75 = 0.0
+    
     drawdown_stats = {
-        '最大回撤': drawdown.max(),
-        '平均回撤': drawdown.mean(),
-        '回撤标准差': drawdown.std(),
-        '5%分位数': non_zero_drawdown.quantile(0.05) if len(non_zero_drawdown) > 0 else 0.0,
-        '10%分位数': non_zero_drawdown.quantile(0.10) if len(non_zero_drawdown) > 0 else 0.0,
-        '25%分位数': non_zero_drawdown.quantile(0.25) if len(non_zero_drawdown) > 0 else 0.0,
-        '50%分位数': non_zero_drawdown.median() if len(non_zero_drawdown) > 0 else 0.0,
-        '75%分位数': non_zero_drawdown.quantile(0.75) if len(non_zero_drawdown) > 0 else 0.0,
+        '最大回撤': np.nanmax(drawdown),
+        '平均回撤': np.nanmean(drawdown),
+        '回撤标准差': np.nanstd(drawdown, ddof=1),
+        '5%分位数': q05,
+        '10%分位数': q10,
+        '25%分位数': q25,
+        '50%分位数': q50,
+        '75%分位数': q75,
         '零回撤比例': zero_ratio * 100,
         '当前回撤': current_drawdown
     }
     
-    # 计算当前回撤的百分位排名
-    # current_percentile = (drawdown <= current_drawdown).mean() * 100
-    current_percentile = (non_zero_drawdown <= current_drawdown).mean() * 100
+    # 计算当前回撤的百分位排名（非零回撤中 <= 当前回撤的比例）
+    if n_non_zero > 0:
+        current_percentile = np.searchsorted(non_zero_sorted, current_drawdown, side='right') / n_non_zero * 100
+    else:
+        current_percentile = np.nan
 
     # 买入建议逻辑（百分位越高越值得买入）
     if current_percentile >= 75:
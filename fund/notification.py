@@ -1,8 +1,7 @@
-import json
-import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from msg import send_bark
 from .drawdown_analyzer import analyze_drawdown_strategy
-from .data_fetcher import update_fund_mapping
+from .data_fetcher import get_fund_nav_by_date, get_fund_names, update_fund_mapping
 
 
 def get_fund_name(fund_code: str) -> str:
@@ -11,36 +10,21 @@ def get_fund_name(fund_code: str) -> str:
     :param fund_code: 基金代码
     :return: 基金名称或基金代码
     """
-    mapping_file = "data/fund_mapping.json"
-    
-    # 读取现有映射
-    fund_mapping = {}
-    if os.path.exists(mapping_file):
-        try:
-            with open(mapping_file, 'r', encoding='utf-8') as f:
-                fund_mapping = json.load(f)
-        except Exception as e:
-            print(f"读取基金映射文件失败: {e}")
-    
-    # 如果映射中已存在，直接返回
-    if fund_code in fund_mapping:
-        return fund_mapping[fund_code]
-    
-    # 如果不存在，尝试更新映射（会查询基金名称）
+    # 映射中已存在时直接返回（文件未修改时使用进程内缓存），否则查询并更新映射
     return update_fund_mapping(fund_code)
 
 
-def send_drawdown_analysis(bark_url: str, fund_code: str):
+def _build_drawdown_message(fund_code: str):
     """
-    通过Bark发送基金回撤分析通知
-    :param bark_url: Bark推送链接
+    分析基金回撤并构建通知内容
     :param fund_code: 基金代码
+    :return: (标题, 内容)，无法获取分析结果时返回None
     """
     # 获取回撤分析结果（静默模式）
     result = analyze_drawdown_strategy(fund_code, silent=True)
     if not result:
         print("无法获取基金分析结果")
-        return False
+        return None
     
     # 构建通知内容
     fund_name = get_fund_name(fund_code)
@@ -53,6 +37,62 @@ def send_drawdown_analysis(bark_url: str, fund_code: str):
 买入建议: {result['suggestion']}
 风险评估: {result['risk_level']}
 理由: {result['reason']}"""
+    return title, content
+
+
+def send_drawdown_analysis(bark_url: str, fund_code: str):
+    """
+    通过Bark发送基金回撤分析通知
+    :param bark_url: Bark推送链接
+    :param fund_code: 基金代码
+    """
+    message = _build_drawdown_message(fund_code)
+    if message is None:
+        return False
     
     # 使用通用的send_bark函数发送
-    return send_bark(bark_url, title, content)
\ No newline at end of file
+    return send_bark(bark_url, *message)
+
+
+def send_drawdown_analysis_batch(bark_urls, fund_codes: list, max_workers: int = 8) -> dict:
+    """
+    批量发送多只基金的回撤分析通知：净值数据并行获取，每只基金只分析一次，推送请求并行发送
+    :param bark_urls: Bark推送链接，单个链接或链接列表
+    :param fund_codes: 基金代码列表
+    :param max_workers: 并行获取净值数据和发送推送的线程数
+    :return: 基金代码 -> 是否向所有链接发送成功
+    """
+    if isinstance(bark_urls, str):
+        bark_urls = [bark_urls]
+    
+    # 先一次性补全基金名称映射，避免各线程重复查询名称表、并发写映射文件
+    get_fund_names(fund_codes)
+    
+    # 并行获取净值数据（网络IO为主），结果落到本地缓存
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(get_fund_nav_by_date, fund_codes))
+    
+    # 分析按顺序进行（此时净值数据均命中缓存），每只基金的通知内容所有链接共用
+    messages = {fund_code: _build_drawdown_message(fund_code) for fund_code in fund_codes}
+    results = {fund_code: messages[fund_code] is not None for fund_code in fund_codes}
+    
+    # 只有推送请求进线程池
+    tasks = [(bark_url, fund_code) for bark_url in bark_urls for fund_code in fund_codes
+             if messages[fund_code] is not None]
+    total = len(tasks)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(send_bark, bark_url, *messages[fund_code]): (bark_url, fund_code)
+                   for bark_url, fund_code in tasks}
+        for current, future in enumerate(as_completed(futures), 1):
+            bark_url, fund_code = futures[future]
+            print(f"[{current}/{total}] 已处理基金 {fund_code} -> {bark_url}")
+            
+            try:
+                success = future.result()
+            except Exception as e:
+                print(f"发送基金 {fund_code} 的分析时发生异常: {e}")
+                success = False
+            if not success:
+                print(f"发送失败: {fund_code} -> {bark_url}")
+                results[fund_code] = False
+    return results
@@ -1,21 +1,303 @@
-import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
 from .data_fetcher import get_fund_nav_by_date, update_fund_mapping, get_shanghai_volume_data
 from .drawdown_analyzer import calculate_fund_drawdown, analyze_drawdown_strategy
 
-# 设置matplotlib中文字体
-plt.rcParams['font.sans-serif'] = ['Heiti TC', 'Arial Unicode MS', 'STHeiti', 'SimHei']
-plt.rcParams['axes.unicode_minus'] = False
+# 百分位线及其颜色
+_DRAWDOWN_PCTS = (10, 25, 50, 75, 90)
+_DRAWDOWN_COLORS = ('orange', 'green', 'blue', 'purple', 'brown')
+_GAIN_PCTS = (25, 50, 75, 90, 95)
+_GAIN_COLORS = ('lightgreen', 'green', 'darkgreen', 'forestgreen', 'darkseagreen')
+_LOSS_PCTS = (5, 10, 25, 50, 75)
+_LOSS_COLORS = ('darkred', 'red', 'orange', 'coral', 'lightcoral')
+# 文字框样式（matplotlib会复制bbox参数，可以共用）
+_INFO_BBOX = dict(boxstyle='round', facecolor='lightblue', alpha=0.8)
+_STATS_BBOX = dict(boxstyle='round', facecolor='lightgray', alpha=0.8)
 
+# 本模块图形的渲染设置：开启路径简化，长序列折线渲染时合并亚像素级的线段
+# 只在渲染本模块自建的图形时通过rc_context生效，不修改全局rcParams
+_PLOT_RC = {'path.simplify': True, 'path.simplify_threshold': 1.0}
 
-def plot_drawdown_hist(fund_code: str, recent_days: int = None, show_percentiles: bool = True):
+# matplotlib只在第一次绘图时导入，仅导入本模块时不加载
+plt = None
+# 中文字体只在第一次绘图时设置
+_FONTS_SET = False
+
+
+def _setup_fonts():
+    """设置matplotlib中文字体（只执行一次）"""
+    global _FONTS_SET
+    if _FONTS_SET:
+        return
+    import matplotlib
+    matplotlib.rcParams['font.sans-serif'] = ['Heiti TC', 'Arial Unicode MS', 'STHeiti', 'SimHei']
+    matplotlib.rcParams['axes.unicode_minus'] = False
+    _FONTS_SET = True
+
+
+def _mpl():
+    """
+    导入pyplot（只有需要弹出图表窗口时才用到）
+    :return: matplotlib.pyplot模块
+    """
+    global plt
+    if plt is None:
+        import matplotlib.pyplot as _plt
+        plt = _plt
+    return plt
+
+
+def _new_figure(show: bool, **fig_kw):
+    """
+    新建图形
+    :param show: 为True时通过pyplot创建以便弹出窗口；为False时直接创建Figure，保存时使用Agg画布，不经过pyplot和图形界面
+    :param fig_kw: 传给Figure的参数，如figsize
+    :return: Figure
+    """
+    if show:
+        return _mpl().figure(**fig_kw)
+    from matplotlib.figure import Figure
+    return Figure(**fig_kw)
+
+
+def _finish_figure(fig, show: bool, save_path: str = None):
+    """
+    渲染自建的图形：保存和显示都在_PLOT_RC设置下进行，结束后关闭图形
+    :param fig: 图形
+    :param show: 是否弹出图表窗口
+    :param save_path: 保存图片的路径，为None时不保存
+    """
+    import matplotlib
+    fig.tight_layout()
+    with matplotlib.rc_context(_PLOT_RC):
+        if save_path:
+            fig.savefig(save_path, bbox_inches='tight')
+        if show:
+            plt.show()
+    if show:
+        plt.close(fig)
+
+
+# 基金代码 -> 基金名称，批量绘图时每只基金只查询一次映射
+_NAME_CACHE = {}
+
+
+def _fund_name(fund_code: str) -> str:
+    """
+    获取基金名称（进程内缓存）
+    :param fund_code: 基金代码
+    :return: 基金名称，查询不到时返回基金代码
+    """
+    name = _NAME_CACHE.get(fund_code)
+    if name is None:
+        name = update_fund_mapping(fund_code)
+        _NAME_CACHE[fund_code] = name
+    return name
+
+
+def _legend_proxies(labels, colors, **style) -> list:
+    """
+    为一次性绘制的多条参考线（vlines/hlines）生成图例代理
+    :param labels: 每条线的图例文字
+    :param colors: 每条线的颜色
+    :param style: 线型等公共样式
+    :return: Line2D列表
+    """
+    from matplotlib.lines import Line2D
+    return [Line2D([], [], color=color, label=label, **style) for label, color in zip(labels, colors)]
+
+
+def _downsample(x: np.ndarray, y: np.ndarray, max_pts: int = 1500):
+    """
+    长序列绘图前降采样：按桶保留每段的最小值和最大值，回撤峰值不会丢失
+    :param x: 横轴数据
+    :param y: 纵轴数据
+    :param max_pts: 最多保留的点数
+    :return: (x, y) 降采样后的数组，长度不超过max_pts时原样返回
+    """
+    n = len(x)
+    if n <= max_pts:
+        return x, y
+    
+    # 每个桶贡献最小、最大两个点；末尾不足一桶时用最后一个值补齐
+    stride = -(-n // (max_pts // 2))
+    n_buckets = -(-n // stride)
+    pad = n_buckets * stride - n
+    buckets = np.concatenate((y, np.full(pad, y[-1]))).reshape(n_buckets, stride)
+    offsets = np.arange(0, n_buckets * stride, stride)
+    idx = np.concatenate((
+        [0],
+        offsets + buckets.argmin(axis=1),
+        offsets + buckets.argmax(axis=1),
+        [n - 1],
+    ))
+    idx = np.unique(np.minimum(idx, n - 1))
+    return x[idx], y[idx]
+
+
+def _sorted_percentile(sorted_arr: np.ndarray, percentiles) -> np.ndarray:
+    """
+    在已排序数组上按线性插值取百分位（与np.percentile默认方法一致），无需再次排序
+    :param sorted_arr: 升序排列的非空数组
+    :param percentiles: 百分位列表（0-100）
+    :return: 各百分位对应的值
+    """
+    pos = np.asarray(percentiles, dtype=np.float64) / 100.0 * (sorted_arr.size - 1)
+    lo = np.floor(pos).astype(np.intp)
+    hi = np.minimum(lo + 1, sorted_arr.size - 1)
+    frac = pos - lo
+    return sorted_arr[lo] + (sorted_arr[hi] - sorted_arr[lo]) * frac
+
+
+def _query_counts(gains: np.ndarray, losses: np.ndarray, flat_days: int, q: float):
+    """
+    在已排序的涨幅、跌幅数组上二分查找，统计查询值相关的计数
+    :param gains: 升序排列的上涨日涨幅
+    :param losses: 升序排列的下跌日跌幅
+    :param flat_days: 平盘天数
+    :param q: 查询值（%）
+    :return: (<=q的天数, ==q的天数, 跌幅比q更大的天数, 涨幅比q更大的天数)
+    """
+    loss_lo = int(np.searchsorted(losses, q, side='left'))
+    loss_hi = int(np.searchsorted(losses, q, side='right'))
+    gain_lo = int(np.searchsorted(gains, q, side='left'))
+    gain_hi = int(np.searchsorted(gains, q, side='right'))
+    
+    if q < 0:
+        n_le = loss_hi
+        n_eq = loss_hi - loss_lo
+    elif q == 0:
+        n_le = losses.size + flat_days
+        n_eq = flat_days
+    else:
+        n_le = losses.size + flat_days + gain_hi
+        n_eq = gain_hi - gain_lo
+    return n_le, n_eq, loss_lo, gains.size - gain_hi
+
+
+def _compute_stats(dr: np.ndarray, gains: np.ndarray, losses: np.ndarray, query_value: float = None) -> dict:
+    """
+    一次性计算涨跌分布图和打印报告用到的全部统计量
+    :param dr: 涨跌幅数组（%）
+    :param gains: 上涨日涨幅数组（升序）
+    :param losses: 下跌日跌幅数组（升序）
+    :param query_value: 查询值（%），为None时不计算查询相关统计
+    :return: 统计量字典
+    """
+    stats = {
+        'mean': dr.mean(),
+        'std': dr.std(ddof=1),
+        'max': dr.max(),
+        'min': dr.min(),
+        'gain_days': len(gains),
+        'loss_days': len(losses),
+        'flat_days': dr.size - len(gains) - len(losses),
+        'total_days': dr.size,
+    }
+    
+    # 查询值相关的计数在已排序的涨跌幅上二分查找得到
+    if query_value is not None:
+        n_le, n_eq, n_loss_worse, n_gain_better = _query_counts(gains, losses, stats['flat_days'], float(query_value))
+        n_gains, n_losses = len(gains), len(losses)
+        stats['total_percentile'] = n_le / dr.size * 100
+        stats['worse_loss_pct'] = n_loss_worse / n_losses * 100 if n_losses > 0 else 0
+        stats['gain_percentile'] = (n_gains - n_gain_better) / n_gains * 100 if n_gains > 0 else 0
+        stats['better_gain_percentile'] = n_gain_better / n_gains * 100 if n_gains > 0 else 0
+        stats['exact_count'] = n_eq
+    
+    return stats
+
+
+def _suggestion(query_value: float, stats: dict):
+    """
+    根据查询值在历史中的百分位给出交易建议，图上建议框和打印的交易建议共用
+    :param query_value: 查询值（%）
+    :param stats: _compute_stats的返回值（需包含查询相关统计）
+    :return: (图上建议, 建议框颜色, 图上理由, 建议操作, 分析依据, 风险评估)
+    """
+    total_percentile = stats['total_percentile']
+    
+    if query_value < 0:  # 跌幅
+        drop = abs(query_value)
+        exceed = 100 - stats['worse_loss_pct']
+        if total_percentile <= 5:
+            short, color = "强烈买入", "darkgreen"
+            suggestion = "强烈买入"
+            reason = f"当前跌幅{drop:.2f}%超过了{exceed:.1f}%的下跌日，属于极端下跌"
+            risk = "低风险，但需注意是否有基本面恶化"
+        elif total_percentile <= 10:
+            short, color = "买入", "green"
+            suggestion = "买入"
+            reason = f"当前跌幅{drop:.2f}%超过了{exceed:.1f}%的下跌日，属于罕见下跌"
+            risk = "中低风险"
+        elif total_percentile <= 25:
+            short, color = "考虑买入", "lightgreen"
+            suggestion = "考虑买入"
+            reason = f"当前跌幅{drop:.2f}%超过了{exceed:.1f}%的下跌日，较为少见"
+            risk = "中等风险"
+        elif total_percentile <= 50:
+            short, color = "观望", "orange"
+            suggestion = "观望"
+            reason = f"当前跌幅{drop:.2f}%超过了{exceed:.1f}%的下跌日，属于正常范围"
+            risk = "中等风险"
+        else:
+            short, color = "谨慎", "red"
+            suggestion = "谨慎，可能继续下跌"
+            reason = f"当前跌幅{drop:.2f}%仅超过了{exceed:.1f}%的下跌日，较为常见"
+            risk = "中高风险"
+        reason_short = f"超过{exceed:.0f}%下跌日"
+    
+    elif query_value > 0:  # 涨幅
+        gain_percentile = stats['gain_percentile']
+        if total_percentile >= 95:
+            short, color = "考虑卖出", "red"
+            suggestion = "考虑卖出"
+            reason = f"当前涨幅{query_value:.2f}%超过了{gain_percentile:.1f}%的上涨日，属于极端上涨"
+            risk = "高风险持有"
+        elif total_percentile >= 90:
+            short, color = "可以卖出", "orange"
+            suggestion = "可以卖出"
+            reason = f"当前涨幅{query_value:.2f}%超过了{gain_percentile:.1f}%的上涨日，属于罕见上涨"
+            risk = "中高风险"
+        elif total_percentile >= 75:
+            short, color = "观望减仓", "yellow"
+            suggestion = "观望或小幅减仓"
+            reason = f"当前涨幅{query_value:.2f}%超过了{gain_percentile:.1f}%的上涨日，涨幅较大"
+            risk = "中等风险"
+        elif total_percentile >= 50:
+            short, color = "持有", "lightgreen"
+            suggestion = "持有"
+            reason = f"当前涨幅{query_value:.2f}%超过了{gain_percentile:.1f}%的上涨日，属于正常范围"
+            risk = "中低风险"
+        else:
+            short, color = "可以买入", "green"
+            suggestion = "可以买入"
+            reason = f"当前涨幅{query_value:.2f}%仅超过了{gain_percentile:.1f}%的上涨日，涨幅较小"
+            risk = "低风险"
+        reason_short = f"超过{gain_percentile:.0f}%上涨日"
+    
+    else:  # 平盘
+        short, color, reason_short = "观望", "gray", "平盘"
+        suggestion = "观望"
+        reason = "当前无涨跌，建议观察市场趋势"
+        risk = "低风险"
+    
+    return short, color, reason_short, suggestion, reason, risk
+
+
+def plot_drawdown_hist(fund_code: str, recent_days: int = None, show_percentiles: bool = True, ax=None,
+                       show: bool = True, save_path: str = None):
     """
     获取基金净值并绘制回撤率与日期的折线图
     :param fund_code: 基金代码
     :param recent_days: 使用最近多少天的数据，默认365天
     :param show_percentiles: 是否显示百分位线
+    :param ax: 绘制到指定的Axes上；为None时新建图形并显示，批量绘图时可复用同一个Axes
+    :param show: 是否弹出图表窗口；为False时不经过pyplot和图形界面，适合无界面环境（仅对新建的图形有效）
+    :param save_path: 新建图形时保存图片的路径，为None时不保存
     """
+    _setup_fonts()
+    
     df = get_fund_nav_by_date(fund_code)
     try:
         df_to_use, drawdown = calculate_fund_drawdown(df, fund_code, recent_days=recent_days)
@@ -24,83 +306,115 @@ def plot_drawdown_hist(fund_code: str, recent_days: int = None, show_percentiles
         return
     
     # 获取基金名称
-    fund_name = update_fund_mapping(fund_code)
+    fund_name = _fund_name(fund_code)
     title = f"基金{fund_code}回撤率时间序列图"
     if fund_name and fund_name != fund_code:
         title = f"{fund_name}({fund_code})回撤率时间序列图"
     
-    plt.figure(figsize=(12, 6))
-    plt.plot(df_to_use['净值日期'], drawdown, linewidth=1.5, color='red', label='回撤率')
-    plt.fill_between(df_to_use['净值日期'], drawdown, 0, alpha=0.3, color='red')
+    own_figure = ax is None
+    if own_figure:
+        fig = _new_figure(show, figsize=(12, 6))
+        ax = fig.subplots()
+    # 横轴预先转为不带时区的datetime64[D]数组，matplotlib可走快速的日期转换路径
+    nav_dates = df_to_use['净值日期']
+    if nav_dates.dt.tz is not None:
+        nav_dates = nav_dates.dt.tz_localize(None)
+    x = nav_dates.to_numpy(dtype='datetime64[D]')
+    # 折线只画降采样后的点，百分位等统计仍使用完整数据
+    dates, dd = _downsample(x, drawdown)
+    dd_line, = ax.plot(dates, dd, linewidth=1.5, color='red', label='回撤率')
+    legend_handles = [dd_line]
+    ax.fill_between(dates, dd, 0, alpha=0.3, color='red')
     
     # 添加百分位线
     if show_percentiles:
-        percentiles = [10, 25, 50, 75, 90]
-        colors = ['orange', 'green', 'blue', 'purple', 'brown']
-        
-        for i, p in enumerate(percentiles):
-            p_value = np.percentile(drawdown, p)
-            plt.axhline(y=p_value, color=colors[i], linestyle='--', alpha=0.7, 
-                       label=f'{p}%百分位: {p_value:.2f}%')
+        # 一次计算全部百分位，只排序一次
+        p_values = np.percentile(np.asarray(drawdown), _DRAWDOWN_PCTS)
+        # 全部百分位线一次画出（横向铺满坐标轴），图例用代理线条
+        ax.hlines(p_values, 0, 1, transform=ax.get_yaxis_transform(), colors=_DRAWDOWN_COLORS,
+                  linestyles='--', alpha=0.7)
+        legend_handles += _legend_proxies([f'{p}%百分位: {p_value:.2f}%' for p, p_value in zip(_DRAWDOWN_PCTS, p_values)],
+                                          _DRAWDOWN_COLORS, linestyle='--', alpha=0.7)
     
     # 获取策略分析结果
-    strategy_result = analyze_drawdown_strategy(fund_code, silent=True, recent_days=recent_days)
+    # 复用已计算的回撤率，避免重复获取净值和计算回撤
+    strategy_result = analyze_drawdown_strategy(fund_code, silent=True, recent_days=recent_days,
+                                                df=df_to_use, drawdown=drawdown)
     
     # 在右上角显示当前日期、回撤率和策略建议
-    current_date = df_to_use['净值日期'].iloc[-1].strftime('%Y-%m-%d')
-    current_drawdown = drawdown.iloc[-1]
+    current_date = str(x[-1])
+    current_drawdown = drawdown[-1]
     
     info_text = f'当前日期: {current_date}\n当前回撤: {current_drawdown:.2f}%\n\n'
     info_text += f'建议: {strategy_result["suggestion"]}\n'
     info_text += f'理由: {strategy_result["reason"]}\n'
     info_text += f'风险评估: {strategy_result["risk_level"]}'
     
-    plt.text(0.98, 0.95, info_text, transform=plt.gca().transAxes, 
+    ax.text(0.98, 0.95, info_text, transform=ax.transAxes, 
              verticalalignment='top', horizontalalignment='right',
-             bbox=dict(boxstyle='round', facecolor='lightblue', alpha=0.8),
+             bbox=_INFO_BBOX,
              fontsize=9)
     
-    plt.title(title)
-    plt.xlabel("日期")
-    plt.ylabel("回撤率 (%)")
-    plt.grid(True, linestyle='--', alpha=0.5)
-    plt.xticks(rotation=45)
-    plt.legend(loc='upper left')
-    plt.tight_layout()
-    plt.show()
+    ax.set_title(title)
+    ax.set_xlabel("日期")
+    ax.set_ylabel("回撤率 (%)")
+    ax.grid(True, linestyle='--', alpha=0.5)
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.legend(handles=legend_handles, loc='upper left')
+    if own_figure:
+        _finish_figure(fig, show, save_path)
 
 
-def plot_fund_price_change_distribution(fund_code: str, recent_days: int = None, query_value: float = None):
+def plot_fund_price_change_distribution(fund_code: str, recent_days: int = None, query_value: float = None, ax=None,
+                                        show: bool = True, save_path: str = None):
     """
     绘制基金在recent_days内的涨跌分布图，并显示分位值线
     :param fund_code: 基金代码
     :param recent_days: 使用最近多少天的数据
     :param query_value: 查询指定涨跌幅值在历史数据中的百分位（如-3.5表示跌幅3.5%）
+    :param ax: 绘制到指定的Axes上；为None时新建图形并显示，批量绘图时可复用同一个Axes
+    :param show: 是否弹出图表窗口；为False时不经过pyplot和图形界面，适合无界面环境（仅对新建的图形有效）
+    :param save_path: 新建图形时保存图片的路径，为None时不保存
     """
+    _setup_fonts()
+    
     df = get_fund_nav_by_date(fund_code)
     
     if df.empty or '累计净值' not in df.columns:
         print(f"无法获取基金{fund_code}的净值数据")
         return
     
-    # 筛选recent_days的数据
+    # 缓存数据通常已按日期排好序，只有乱序时才排序
+    if not df['净值日期'].is_monotonic_increasing:
+        df = df.sort_values('净值日期', kind='mergesort').reset_index(drop=True)
+    
+    # 只取净值数组，recent_days直接在ndarray上切片，不构造新的DataFrame
+    nav = df['累计净值'].to_numpy(dtype=np.float64, copy=False)
     if recent_days is not None:
-        df = df.tail(recent_days)
+        nav = nav[max(nav.size - recent_days, 0):]
     
-    if len(df) < 2:
+    if nav.size < 2:
         print(f"数据不足，无法计算涨跌幅")
         return
     
-    # 计算每日涨跌幅
-    df = df.sort_values('净值日期').reset_index(drop=True)
-    daily_returns = df['累计净值'].pct_change().dropna() * 100  # 转换为百分比
+    # 计算每日涨跌幅（百分比），之后的统计、比较和绘图都使用dr
+    dr = np.empty(nav.size - 1, dtype=np.float64)
+    np.divide(nav[1:], nav[:-1], out=dr)
+    dr -= 1.0
+    dr *= 100.0
+    if np.isnan(dr).any():
+        dr = dr[~np.isnan(dr)]
     
     # 分开计算涨幅和跌幅
-    gains = daily_returns[daily_returns > 0]  # 涨幅
-    losses = daily_returns[daily_returns < 0]  # 跌幅
+    # 涨跌幅各排序一次，之后的分位值直接按下标取
+    gains = np.sort(dr[dr > 0.0])  # 涨幅
+    losses = np.sort(dr[dr < 0.0])  # 跌幅
+    
+    # 全部统计量只计算一次，图上文字和打印报告共用
+    stats = _compute_stats(dr, gains, losses, query_value)
     
     # 获取基金名称
-    fund_name = update_fund_mapping(fund_code)
+    fund_name = _fund_name(fund_code)
     title = f"基金{fund_code}涨跌分布图"
     if fund_name and fund_name != fund_code:
         title = f"{fund_name}({fund_code})涨跌分布图"
@@ -109,114 +423,67 @@ def plot_fund_price_change_distribution(fund_code: str, recent_days: int = None,
         title += f"（最近{recent_days}天）"
     
     # 创建分布图
-    plt.figure(figsize=(12, 8))
+    own_figure = ax is None
+    if own_figure:
+        fig = _new_figure(show, figsize=(12, 8))
+        ax = fig.subplots()
     
     # 绘制直方图
-    n_bins = min(50, len(daily_returns) // 5)  # 动态调整bins数量
-    plt.hist(daily_returns, bins=n_bins, alpha=0.7, color='skyblue', 
-             edgecolor='black', density=True, label='涨跌幅分布')
-    
-    # 涨幅分位值
+    n_bins = min(50, max(10, dr.size // 5))  # 动态调整bins数量
+    counts, edges = np.histogram(dr, bins=n_bins, density=True)
+    bars = ax.bar(edges[:-1], counts, width=np.diff(edges), align='edge', alpha=0.7, color='skyblue',
+                  edgecolor='black')
+    # 与plt.hist一致，把图例标签放在第一个矩形上，图例中直方图排在最前
+    bars.patches[0].set_label('涨跌幅分布')
+    legend_handles = [bars.patches[0]]
+    
+    # 涨跌幅分位值各计算一次，绘图和后面的打印共用
+    gain_values = _sorted_percentile(gains, _GAIN_PCTS) if len(gains) > 0 else None
+    loss_values = _sorted_percentile(losses, _LOSS_PCTS) if len(losses) > 0 else None
+    
+    # 涨跌幅分位线合并为一次vlines绘制（纵向铺满坐标轴），图例用代理线条
+    pct_values, pct_colors, pct_labels = [], [], []
     if len(gains) > 0:
-        gain_percentiles = [25, 50, 75, 90, 95]
-        gain_colors = ['lightgreen', 'green', 'darkgreen', 'forestgreen', 'darkseagreen']
-        
-        for i, p in enumerate(gain_percentiles):
-            p_value = np.percentile(gains, p)
-            plt.axvline(x=p_value, color=gain_colors[i], linestyle='--', alpha=0.8, linewidth=2,
-                       label=f'涨{p}%分位: {p_value:.2f}%')
-    
-    # 跌幅分位值
+        pct_values.extend(gain_values)
+        pct_colors.extend(_GAIN_COLORS)
+        pct_labels.extend(f'涨{p}%分位: {p_value:.2f}%' for p, p_value in zip(_GAIN_PCTS, gain_values))
     if len(losses) > 0:
-        loss_percentiles = [5, 10, 25, 50, 75]
-        loss_colors = ['darkred', 'red', 'orange', 'coral', 'lightcoral']
-        
-        for i, p in enumerate(loss_percentiles):
-            p_value = np.percentile(losses, p)
-            plt.axvline(x=p_value, color=loss_colors[i], linestyle='--', alpha=0.8, linewidth=2,
-                       label=f'跌{p}%分位: {p_value:.2f}%')
+        pct_values.extend(loss_values)
+        pct_colors.extend(_LOSS_COLORS)
+        pct_labels.extend(f'跌{p}%分位: {p_value:.2f}%' for p, p_value in zip(_LOSS_PCTS, loss_values))
+    if pct_values:
+        ax.vlines(pct_values, 0, 1, transform=ax.get_xaxis_transform(), colors=pct_colors,
+                  linestyles='--', alpha=0.8, linewidths=2)
+        legend_handles += _legend_proxies(pct_labels, pct_colors, linestyle='--', alpha=0.8, linewidth=2)
     
     # 添加0线作为参考
-    plt.axvline(x=0, color='black', linestyle='-', alpha=0.5, linewidth=1, label='零线')
+    legend_handles.append(ax.axvline(x=0, color='black', linestyle='-', alpha=0.5, linewidth=1, label='零线'))
     
     # 如果提供了查询值，添加查询线
     if query_value is not None:
-        plt.axvline(x=query_value, color='magenta', linestyle=':', alpha=0.8, linewidth=3,
-                   label=f'查询值: {query_value:.2f}%')
-    
-    # 添加统计信息
-    mean_return = daily_returns.mean()
-    std_return = daily_returns.std()
-    max_return = daily_returns.max()
-    min_return = daily_returns.min()
-    
-    # 计算涨跌统计
-    gain_days = len(gains)
-    loss_days = len(losses)
-    flat_days = len(daily_returns) - gain_days - loss_days
+        legend_handles.append(ax.axvline(x=query_value, color='magenta', linestyle=':', alpha=0.8, linewidth=3,
+                                         label=f'查询值: {query_value:.2f}%'))
     
     # 在图上显示统计信息
     stats_text = f'统计信息:\n'
-    stats_text += f'均值: {mean_return:.2f}%\n'
-    stats_text += f'标准差: {std_return:.2f}%\n'
-    stats_text += f'最大涨幅: {max_return:.2f}%\n'
-    stats_text += f'最大跌幅: {min_return:.2f}%\n'
-    stats_text += f'上涨天数: {gain_days}天\n'
-    stats_text += f'下跌天数: {loss_days}天\n'
-    if flat_days > 0:
-        stats_text += f'平盘天数: {flat_days}天\n'
-    stats_text += f'总天数: {len(daily_returns)}天'
-    
-    plt.text(0.98, 0.95, stats_text, transform=plt.gca().transAxes,
+    stats_text += f'均值: {stats["mean"]:.2f}%\n'
+    stats_text += f'标准差: {stats["std"]:.2f}%\n'
+    stats_text += f'最大涨幅: {stats["max"]:.2f}%\n'
+    stats_text += f'最大跌幅: {stats["min"]:.2f}%\n'
+    stats_text += f'上涨天数: {stats["gain_days"]}天\n'
+    stats_text += f'下跌天数: {stats["loss_days"]}天\n'
+    if stats['flat_days'] > 0:
+        stats_text += f'平盘天数: {stats["flat_days"]}天\n'
+    stats_text += f'总天数: {stats["total_days"]}天'
+    
+    ax.text(0.98, 0.95, stats_text, transform=ax.transAxes,
              verticalalignment='top', horizontalalignment='right',
-             bbox=dict(boxstyle='round', facecolor='lightgray', alpha=0.8),
+             bbox=_STATS_BBOX,
              fontsize=10)
     
     # 如果提供了查询值，在图上添加交易建议
     if query_value is not None:
-        # 计算交易建议（复制之前的逻辑）
-        total_percentile = (daily_returns <= query_value).mean() * 100
-        
-        if query_value < 0:  # 跌幅
-            worse_loss_pct = (losses < query_value).mean() * 100 if len(losses) > 0 else 0
-            if total_percentile <= 5:
-                suggestion = "强烈买入"
-                color = "darkgreen"
-            elif total_percentile <= 10:
-                suggestion = "买入"
-                color = "green"
-            elif total_percentile <= 25:
-                suggestion = "考虑买入"
-                color = "lightgreen"
-            elif total_percentile <= 50:
-                suggestion = "观望"
-                color = "orange"
-            else:
-                suggestion = "谨慎"
-                color = "red"
-            reason_short = f"超过{100-worse_loss_pct:.0f}%下跌日"
-        elif query_value > 0:  # 涨幅
-            gain_percentile = (gains <= query_value).mean() * 100 if len(gains) > 0 else 0
-            if total_percentile >= 95:
-                suggestion = "考虑卖出"
-                color = "red"
-            elif total_percentile >= 90:
-                suggestion = "可以卖出"
-                color = "orange"
-            elif total_percentile >= 75:
-                suggestion = "观望减仓"
-                color = "yellow"
-            elif total_percentile >= 50:
-                suggestion = "持有"
-                color = "lightgreen"
-            else:
-                suggestion = "可以买入"
-                color = "green"
-            reason_short = f"超过{gain_percentile:.0f}%上涨日"
-        else:
-            suggestion = "观望"
-            color = "gray"
-            reason_short = "平盘"
+        short_suggestion, color, reason_short, suggestion, reason, risk = _suggestion(query_value, stats)
         
         # 在图表左下角添加交易建议框
         from datetime import datetime
@@ -224,21 +491,21 @@ def plot_fund_price_change_distribution(fund_code: str, recent_days: int = None,
         
         advice_text = f'分析日期: {current_date}\n'
         advice_text += f'查询值: {query_value:.2f}%\n'
-        advice_text += f'建议操作: {suggestion}\n'
+        advice_text += f'建议操作: {short_suggestion}\n'
         advice_text += f'{reason_short}'
         
-        plt.text(0.02, 0.02, advice_text, transform=plt.gca().transAxes,
+        ax.text(0.02, 0.02, advice_text, transform=ax.transAxes,
                 verticalalignment='bottom', horizontalalignment='left',
                 bbox=dict(boxstyle='round,pad=0.5', facecolor=color, alpha=0.2, edgecolor=color),
                 fontsize=10, weight='bold')
 
-    plt.title(title, fontsize=14)
-    plt.xlabel("涨跌幅 (%)", fontsize=12)
-    plt.ylabel("概率密度", fontsize=12)
-    plt.grid(True, linestyle='--', alpha=0.3)
-    plt.legend(loc='upper left', fontsize=8)
-    plt.tight_layout()
-    plt.show()
+    ax.set_title(title, fontsize=14)
+    ax.set_xlabel("涨跌幅 (%)", fontsize=12)
+    ax.set_ylabel("概率密度", fontsize=12)
+    ax.grid(True, linestyle='--', alpha=0.3)
+    ax.legend(handles=legend_handles, loc='upper left', fontsize=8)
+    if own_figure:
+        _finish_figure(fig, show, save_path)
     
     # 打印详细的分位值信息
     print(f"\n=== {title} 分位值统计 ===")
@@ -246,9 +513,7 @@ def plot_fund_price_change_distribution(fund_code: str, recent_days: int = None,
     # 涨幅分位值统计
     if len(gains) > 0:
         print(f"\n涨幅分位值统计 (共{len(gains)}个上涨日):")
-        gain_percentiles = [25, 50, 75, 90, 95]
-        for p in gain_percentiles:
-            p_value = np.percentile(gains, p)
+        for p, p_value in zip(_GAIN_PCTS, gain_values):
             print(f"  涨{p:2d}%分位值: {p_value:6.2f}%")
     else:
         print(f"\n无上涨日数据")
@@ -256,29 +521,26 @@ def plot_fund_price_change_distribution(fund_code: str, recent_days: int = None,
     # 跌幅分位值统计  
     if len(losses) > 0:
         print(f"\n跌幅分位值统计 (共{len(losses)}个下跌日):")
-        loss_percentiles = [5, 10, 25, 50, 75]
-        for p in loss_percentiles:
-            p_value = np.percentile(losses, p)
+        for p, p_value in zip(_LOSS_PCTS, loss_values):
             print(f"  跌{p:2d}%分位值: {p_value:6.2f}%")
     else:
         print(f"\n无下跌日数据")
     
     print(f"\n基本统计:")
-    print(f"平均涨跌幅: {mean_return:6.2f}%")
-    print(f"标准差:     {std_return:6.2f}%")
-    print(f"最大涨幅:   {max_return:6.2f}%")
-    print(f"最大跌幅:   {min_return:6.2f}%")
-    print(f"上涨天数:   {gain_days:6d}天 ({gain_days/len(daily_returns)*100:.1f}%)")
-    print(f"下跌天数:   {loss_days:6d}天 ({loss_days/len(daily_returns)*100:.1f}%)")
-    if flat_days > 0:
-        print(f"平盘天数:   {flat_days:6d}天 ({flat_days/len(daily_returns)*100:.1f}%)")
-    print(f"数据期间:   {len(daily_returns)}个交易日")
+    total_days = stats['total_days']
+    print(f"平均涨跌幅: {stats['mean']:6.2f}%")
+    print(f"标准差:     {stats['std']:6.2f}%")
+    print(f"最大涨幅:   {stats['max']:6.2f}%")
+    print(f"最大跌幅:   {stats['min']:6.2f}%")
+    print(f"上涨天数:   {stats['gain_days']:6d}天 ({stats['gain_days']/total_days*100:.1f}%)")
+    print(f"下跌天数:   {stats['loss_days']:6d}天 ({stats['loss_days']/total_days*100:.1f}%)")
+    if stats['flat_days'] > 0:
+        print(f"平盘天数:   {stats['flat_days']:6d}天 ({stats['flat_days']/total_days*100:.1f}%)")
+    print(f"数据期间:   {total_days}个交易日")
     
     # 如果提供了查询值，计算其在历史数据中的百分位
     if query_value is not None:
-        # 计算在全部数据中的百分位
-        total_percentile = (daily_returns <= query_value).mean() * 100
-        
+        total_percentile = stats['total_percentile']
         print(f"\n=== 查询值 {query_value:.2f}% 的百分位分析 ===")
         print(f"在全部数据中的百分位: {total_percentile:.1f}%")
         print(f"即有 {total_percentile:.1f}% 的交易日涨跌幅 <= {query_value:.2f}%")
@@ -296,88 +558,38 @@ def plot_fund_price_change_distribution(fund_code: str, recent_days: int = None,
         if query_value < 0 and len(losses) > 0:
             # 对于跌幅，query_value是负数(-1.13)，losses也都是负数
             # losses < query_value 表示跌得更严重的情况（因为更负的数字表示跌幅更大）
-            worse_loss_percentile = (losses < query_value).mean() * 100
             print(f"在所有下跌日中:")
-            print(f"  有 {worse_loss_percentile:.1f}% 的跌幅比 {abs(query_value):.2f}% 更大")
-            print(f"  有 {100-worse_loss_percentile:.1f}% 的跌幅 <= {abs(query_value):.2f}%")
+            print(f"  有 {stats['worse_loss_pct']:.1f}% 的跌幅比 {abs(query_value):.2f}% 更大")
+            print(f"  有 {100-stats['worse_loss_pct']:.1f}% 的跌幅 <= {abs(query_value):.2f}%")
         
         # 如果是正值（涨幅），计算有多少上涨日比给定涨幅更大
         elif query_value > 0 and len(gains) > 0:
             # 对于涨幅，gains > query_value 表示涨得更好的情况
-            better_gain_percentile = (gains > query_value).mean() * 100
             print(f"在所有上涨日中:")
-            print(f"  有 {better_gain_percentile:.1f}% 的涨幅比 {query_value:.2f}% 更大")
-            print(f"  有 {100-better_gain_percentile:.1f}% 的涨幅 <= {query_value:.2f}%")
+            print(f"  有 {stats['better_gain_percentile']:.1f}% 的涨幅比 {query_value:.2f}% 更大")
+            print(f"  有 {100-stats['better_gain_percentile']:.1f}% 的涨幅 <= {query_value:.2f}%")
         
         # 计算该值出现的频率
-        exact_count = (daily_returns == query_value).sum()
-        if exact_count > 0:
-            print(f"该值在历史中出现过 {exact_count} 次")
+        if stats['exact_count'] > 0:
+            print(f"该值在历史中出现过 {stats['exact_count']} 次")
         
         # 根据百分位提供交易建议
         print(f"\n=== 交易建议 ===")
-        if query_value < 0:  # 跌幅
-            worse_loss_pct = (losses < query_value).mean() * 100 if len(losses) > 0 else 0
-            if total_percentile <= 5:
-                suggestion = "强烈买入"
-                reason = f"当前跌幅{abs(query_value):.2f}%超过了{100-worse_loss_pct:.1f}%的下跌日，属于极端下跌"
-                risk = "低风险，但需注意是否有基本面恶化"
-            elif total_percentile <= 10:
-                suggestion = "买入"
-                reason = f"当前跌幅{abs(query_value):.2f}%超过了{100-worse_loss_pct:.1f}%的下跌日，属于罕见下跌"
-                risk = "中低风险"
-            elif total_percentile <= 25:
-                suggestion = "考虑买入"
-                reason = f"当前跌幅{abs(query_value):.2f}%超过了{100-worse_loss_pct:.1f}%的下跌日，较为少见"
-                risk = "中等风险"
-            elif total_percentile <= 50:
-                suggestion = "观望"
-                reason = f"当前跌幅{abs(query_value):.2f}%超过了{100-worse_loss_pct:.1f}%的下跌日，属于正常范围"
-                risk = "中等风险"
-            else:
-                suggestion = "谨慎，可能继续下跌"
-                reason = f"当前跌幅{abs(query_value):.2f}%仅超过了{100-worse_loss_pct:.1f}%的下跌日，较为常见"
-                risk = "中高风险"
-        
-        elif query_value > 0:  # 涨幅
-            gain_percentile = (gains <= query_value).mean() * 100 if len(gains) > 0 else 0
-            if total_percentile >= 95:
-                suggestion = "考虑卖出"
-                reason = f"当前涨幅{query_value:.2f}%超过了{gain_percentile:.1f}%的上涨日，属于极端上涨"
-                risk = "高风险持有"
-            elif total_percentile >= 90:
-                suggestion = "可以卖出"
-                reason = f"当前涨幅{query_value:.2f}%超过了{gain_percentile:.1f}%的上涨日，属于罕见上涨"
-                risk = "中高风险"
-            elif total_percentile >= 75:
-                suggestion = "观望或小幅减仓"
-                reason = f"当前涨幅{query_value:.2f}%超过了{gain_percentile:.1f}%的上涨日，涨幅较大"
-                risk = "中等风险"
-            elif total_percentile >= 50:
-                suggestion = "持有"
-                reason = f"当前涨幅{query_value:.2f}%超过了{gain_percentile:.1f}%的上涨日，属于正常范围"
-                risk = "中低风险"
-            else:
-                suggestion = "可以买入"
-                reason = f"当前涨幅{query_value:.2f}%仅超过了{gain_percentile:.1f}%的上涨日，涨幅较小"
-                risk = "低风险"
-        
-        else:  # 平盘
-            suggestion = "观望"
-            reason = "当前无涨跌，建议观察市场趋势"
-            risk = "低风险"
-
         print(f"建议操作: {suggestion}")
         print(f"分析依据: {reason}")
         print(f"风险评估: {risk}")
 
 
-def plot_shanghai_volume_trend(start_date: str = None, end_date: str = None):
+def plot_shanghai_volume_trend(start_date: str = None, end_date: str = None, show: bool = True, save_path: str = None):
     """
     绘制上证指数成交额走势图
     :param start_date: 开始日期，格式为 'YYYY-MM-DD'，如果为None则获取最近1年数据
     :param end_date: 结束日期，格式为 'YYYY-MM-DD'，如果为None则使用今日
+    :param show: 是否弹出图表窗口；为False时不经过pyplot和图形界面，适合无界面环境
+    :param save_path: 保存图片的路径，为None时不保存
     """
+    _setup_fonts()
+    
     df = get_shanghai_volume_data(start_date, end_date)
     
     if df.empty:
@@ -397,7 +609,8 @@ def plot_shanghai_volume_trend(start_date: str = None, end_date: str = None):
         return
     
     # 创建图形
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10), height_ratios=[2, 1], sharex=True)
+    fig = _new_figure(show, figsize=(12, 10))
+    ax1, ax2 = fig.subplots(2, 1, height_ratios=[2, 1], sharex=True)
     
     # 绘制收盘价走势图
     ax1.plot(df['日期'], df['收盘'], linewidth=1.5, color='blue', label='上证指数收盘价')
@@ -470,7 +683,7 @@ def plot_shanghai_volume_trend(start_date: str = None, end_date: str = None):
     
     ax2.text(0.02, 0.98, stats_text, transform=ax2.transAxes,
              verticalalignment='top', horizontalalignment='left',
-             bbox=dict(boxstyle='round', facecolor='lightgray', alpha=0.8),
+             bbox=_STATS_BBOX,
              fontsize=9)
     
     # 在图表右下角添加投资建议
@@ -480,9 +693,8 @@ def plot_shanghai_volume_trend(start_date: str = None, end_date: str = None):
              fontsize=10, weight='bold')
     
     # 旋转x轴日期标签
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    plt.show()
+    ax2.tick_params(axis='x', labelrotation=45)
+    _finish_figure(fig, show, save_path)
     
     # 打印统计信息
     print(f"\n=== 上证指数成交额统计 ===")
@@ -2,8 +2,8 @@ import akshare as ak
 import pandas as pd
 import numpy as np
 import os
-import json
 from datetime import datetime
+from functools import reduce
 
 
 def get_macro_data(start_date: str = None, end_date: str = None) -> pd.DataFrame:
@@ -22,21 +22,26 @@ def get_macro_data(start_date: str = None, end_date: str = None) -> pd.DataFrame
         start_datetime = datetime.now() - pd.DateOffset(days=365*5)
         start_date = start_datetime.strftime('%Y-%m-%d')
     
-    cache_file = f"data/macro_data_{start_date}_{end_date}.json"
+    cache_file = f"data/macro_data_{start_date}_{end_date}.feather"
+    legacy_cache_file = f"data/macro_data_{start_date}_{end_date}.json"
     
-    # 尝试读取缓存
-    if os.path.exists(cache_file):
-        try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            df = pd.DataFrame(data)
-            if not df.empty:
-                print(f"使用缓存的宏观数据: {cache_file}")
-                return df
-        except Exception as e:
-            print(f"读取宏观数据缓存失败: {e}")
+    # 尝试读取缓存（兼容旧版json缓存）
+    try:
+        df = None
+        if os.path.exists(cache_file):
+            df = pd.read_feather(cache_file)
+        elif os.path.exists(legacy_cache_file):
+            cache_file = legacy_cache_file
+            df = pd.read_json(legacy_cache_file, orient='records')
+        if df is not None and not df.empty:
+            print(f"使用缓存的宏观数据: {cache_file}")
+            return df
+    except Exception as e:
+        print(f"读取宏观数据缓存失败: {e}")
     
     macro_data = []
+    # 日期边界只解析一次，之后在有序日期索引上切片筛选
+    start_ts, end_ts = pd.Timestamp(start_date), pd.Timestamp(end_date)
     
     try:
         print("正在获取宏观经济数据...")
@@ -49,26 +54,23 @@ def get_macro_data(start_date: str = None, end_date: str = None) -> pd.DataFrame
                 bond_10y['date'] = pd.to_datetime(bond_10y['date'])
                 bond_10y = bond_10y[['date', 'bond_10y']].dropna()
                 # 手动筛选日期范围
-                bond_10y = bond_10y[(bond_10y['date'] >= start_date) & (bond_10y['date'] <= end_date)]
+                bond_10y = bond_10y.set_index('date').sort_index().loc[start_ts:end_ts].reset_index()
                 print(f"获取到 {len(bond_10y)} 条国债收益率数据")
             else:
                 print("未获取到国债收益率数据")
-                bond_10y = pd.DataFrame(columns=['date', 'bond_10y'])
+                bond_10y = None
         except Exception as e:
             print(f"获取国债收益率失败: {e}")
-            bond_10y = pd.DataFrame(columns=['date', 'bond_10y'])
+            bond_10y = None
         
         # 2. 获取M1/M2货币供应量（月度数据）
         try:
             # 尝试不同的API名称
             try:
-                m0_data = ak.macro_china_m0()
                 m1_data = ak.macro_china_m1_ml()
-                m2_data = ak.macro_china_m2_ml()
             except:
-                # 如果上述不存在，尝试其他接口
+                # 如果上述不存在，尝试其他接口（货币供应量数据同时包含M1和M2，后续直接从中取列）
                 m1_data = ak.macro_china_money_supply()
-                m2_data = m1_data.copy()  # 货币供应量数据可能包含M1和M2
             
             if not m1_data.empty:
                 # 检查列名并处理
@@ -88,20 +90,13 @@ def get_macro_data(start_date: str = None, end_date: str = None) -> pd.DataFrame
                         m2_col = col
                 
                 if date_col and (m1_col or m2_col):
-                    money_data = m1_data[[date_col]].copy()
-                    money_data = money_data.rename(columns={date_col: 'date'})
-                    # 处理中文日期格式，如 "2025年07月份"
-                    def parse_chinese_date(date_str):
-                        try:
-                            if pd.isna(date_str):
-                                return pd.NaT
-                            # 移除"份"字，替换年月为标准格式
-                            date_str = str(date_str).replace('份', '').replace('年', '-').replace('月', '-01')
-                            return pd.to_datetime(date_str)
-                        except:
-                            return pd.NaT
-                    
-                    money_data['date'] = money_data['date'].apply(parse_chinese_date)
+                    money_data = m1_data[[date_col]].rename(columns={date_col: 'date'})
+                    # 处理中文日期格式，如 "2025年07月份"：整列替换为标准格式后一次性解析
+                    date_str = (money_data['date'].astype(str)
+                                .str.replace('份', '', regex=False)
+                                .str.replace('年', '-', regex=False)
+                                .str.replace('月', '-01', regex=False))
+                    money_data['date'] = pd.to_datetime(date_str, errors='coerce')
                     
                     if m1_col:
                         money_data['m1_growth'] = m1_data[m1_col]  # 直接使用同比增长率
@@ -113,13 +108,13 @@ def get_macro_data(start_date: str = None, end_date: str = None) -> pd.DataFrame
                     print(f"获取到 {len(money_data)} 条货币供应量数据")
                 else:
                     print("未找到正确的货币供应量列")
-                    money_data = pd.DataFrame(columns=['date', 'm1_growth', 'm2_growth'])
+                    money_data = None
             else:
                 print("未获取到货币供应量数据")
-                money_data = pd.DataFrame(columns=['date', 'm1_growth', 'm2_growth'])
+                money_data = None
         except Exception as e:
             print(f"获取货币供应量失败: {e}")
-            money_data = pd.DataFrame(columns=['date', 'm1_growth', 'm2_growth'])
+            money_data = None
         
         # 3. 获取PMI指数
         try:
@@ -142,20 +137,20 @@ def get_macro_data(start_date: str = None, end_date: str = None) -> pd.DataFrame
                         pmi_col = col
                 
                 if date_col and pmi_col:
-                    pmi_data = pmi_data[[date_col, pmi_col]].copy()
-                    pmi_data = pmi_data.rename(columns={date_col: 'date', pmi_col: 'pmi'})
-                    pmi_data['date'] = pd.to_datetime(pmi_data['date'])
-                    pmi_data = pmi_data.dropna()
+                    pmi_data = (pmi_data[[date_col, pmi_col]]
+                                .rename(columns={date_col: 'date', pmi_col: 'pmi'})
+                                .assign(date=lambda d: pd.to_datetime(d['date']))
+                                .dropna())
                     print(f"获取到 {len(pmi_data)} 条PMI数据")
                 else:
                     print("未找到正确的PMI列")
-                    pmi_data = pd.DataFrame(columns=['date', 'pmi'])
+                    pmi_data = None
             else:
                 print("未获取到PMI数据")
-                pmi_data = pd.DataFrame(columns=['date', 'pmi'])
+                pmi_data = None
         except Exception as e:
             print(f"获取PMI失败: {e}")
-            pmi_data = pd.DataFrame(columns=['date', 'pmi'])
+            pmi_data = None
         
         # 4. 获取美元指数
         try:
@@ -166,10 +161,10 @@ def get_macro_data(start_date: str = None, end_date: str = None) -> pd.DataFrame
                 try:
                     usd_index = ak.currency_usd_index()
                 except:
-                    # 如果以上都失败，创建空DataFrame
-                    usd_index = pd.DataFrame()
+                    # 如果以上都失败，跳过此指标
+                    usd_index = None
             
-            if not usd_index.empty:
+            if usd_index is not None and not usd_index.empty:
                 print(f"美元指数数据列名: {list(usd_index.columns)}")
                 
                 # 寻找正确的列名
@@ -183,44 +178,41 @@ def get_macro_data(start_date: str = None, end_date: str = None) -> pd.DataFrame
                         usd_col = col
                 
                 if date_col and usd_col:
-                    usd_index = usd_index[[date_col, usd_col]].copy()
-                    usd_index = usd_index.rename(columns={date_col: 'date', usd_col: 'usd_index'})
-                    usd_index['date'] = pd.to_datetime(usd_index['date'])
-                    usd_index = usd_index.dropna()
+                    usd_index = (usd_index[[date_col, usd_col]]
+                                 .rename(columns={date_col: 'date', usd_col: 'usd_index'})
+                                 .assign(date=lambda d: pd.to_datetime(d['date']))
+                                 .dropna())
                     
                     # 过滤日期范围
-                    usd_index = usd_index[(usd_index['date'] >= start_date) & 
-                                        (usd_index['date'] <= end_date)]
+                    usd_index = usd_index.set_index('date').sort_index().loc[start_ts:end_ts].reset_index()
                     print(f"获取到 {len(usd_index)} 条美元指数数据")
                 else:
                     print("未找到正确的美元指数列")
-                    usd_index = pd.DataFrame(columns=['date', 'usd_index'])
+                    usd_index = None
             else:
                 print("未获取到美元指数数据，将跳过此指标")
-                usd_index = pd.DataFrame(columns=['date', 'usd_index'])
+                usd_index = None
         except Exception as e:
             print(f"获取美元指数失败: {e}")
-            usd_index = pd.DataFrame(columns=['date', 'usd_index'])
+            usd_index = None
         
         # 合并所有宏观数据
         all_dfs = [bond_10y, money_data, pmi_data, usd_index]
-        valid_dfs = [df for df in all_dfs if not df.empty]
+        valid_dfs = [df for df in all_dfs if df is not None and not df.empty]
         
         if valid_dfs:
-            # 从第一个有效的DataFrame开始
-            macro_df = valid_dfs[0]
-            
-            # 逐个合并其他DataFrame
-            for df in valid_dfs[1:]:
-                macro_df = pd.merge(macro_df, df, on='date', how='outer')
-            
-            # 按日期排序并前向填充
-            macro_df = macro_df.sort_values('date').reset_index(drop=True)
-            macro_df = macro_df.ffill()  # 使用新的前向填充方法
+            indexed_dfs = [df.set_index('date').sort_index() for df in valid_dfs]
+            if all(df.index.is_unique for df in indexed_dfs):
+                # 各数据日期唯一时按日期索引对齐拼接，再统一前向填充
+                macro_df = pd.concat(indexed_dfs, axis=1, join='outer', sort=True).ffill().reset_index()
+            else:
+                # 存在重复日期时无法按索引对齐，退回有序合并（合并时即前向填充）
+                macro_df = reduce(
+                    lambda left, right: pd.merge_ordered(left, right, on='date', how='outer', fill_method='ffill'),
+                    (df.sort_values('date') for df in valid_dfs))
             
             # 过滤日期范围
-            macro_df = macro_df[(macro_df['date'] >= start_date) & 
-                              (macro_df['date'] <= end_date)]
+            macro_df = macro_df.set_index('date').loc[start_ts:end_ts].reset_index()
             
             print(f"合并后得到 {len(macro_df)} 条宏观数据记录")
         else:
@@ -231,7 +223,7 @@ def get_macro_data(start_date: str = None, end_date: str = None) -> pd.DataFrame
         if not macro_df.empty:
             try:
                 os.makedirs(os.path.dirname(cache_file), exist_ok=True)
-                macro_df.to_json(cache_file, orient='records', force_ascii=False, date_format='iso')
+                macro_df.reset_index(drop=True).to_feather(cache_file, compression='zstd')
                 print(f"宏观数据已缓存到: {cache_file}")
             except Exception as e:
                 print(f"缓存宏观数据失败: {e}")
@@ -263,72 +255,52 @@ def calculate_macro_signals(macro_df: pd.DataFrame, window_size: int = 252*2) ->
     
     # 1. 利率环境信号（基于10年期国债收益率）
     if 'bond_10y' in df.columns:
-        for i in range(len(df)):
-            if i < window_size:
-                historical_data = df['bond_10y'][:i+1].dropna()
-            else:
-                historical_data = df['bond_10y'][i-window_size+1:i+1].dropna()
-            
-            if len(historical_data) > 10:  # 至少需要10个数据点
-                current_value = df['bond_10y'].iloc[i]
-                if pd.notna(current_value):
-                    percentile = np.sum(historical_data <= current_value) / len(historical_data) * 100
-                    # 利率越低对股市越好
-                    if percentile < 20:        # 极低利率
-                        df.at[i, 'interest_rate_signal'] = 2
-                    elif percentile < 40:      # 较低利率
-                        df.at[i, 'interest_rate_signal'] = 1
-                    elif percentile > 80:      # 较高利率
-                        df.at[i, 'interest_rate_signal'] = -1
-                    elif percentile > 90:      # 极高利率
-                        df.at[i, 'interest_rate_signal'] = -2
+        # 滚动窗口内 <= 当前值的比例（只统计非空值，至少需要11个数据点）
+        # pandas滚动排名在C层用跳表维护窗口，单次O(log W)；method='max'保证并列值按 <= 计数
+        percentile = (df['bond_10y'].rolling(window_size, min_periods=11)
+                      .rank(method='max', pct=True) * 100).to_numpy()
+        # 利率越低对股市越好（NaN不满足任何条件，保持0）
+        # 极端档位先于一般档位判断
+        df['interest_rate_signal'] = np.select(
+            [percentile < 20,      # 极低利率
+             percentile < 40,      # 较低利率
+             percentile > 90,      # 极高利率
+             percentile > 80],     # 较高利率
+            [2, 1, -2, -1], default=0)
     
     # 2. 货币政策信号（基于M1/M2增速）
     if 'm1_growth' in df.columns and 'm2_growth' in df.columns:
-        for i in range(len(df)):
-            m1_growth = df['m1_growth'].iloc[i]
-            m2_growth = df['m2_growth'].iloc[i]
-            
-            if pd.notna(m1_growth) and pd.notna(m2_growth):
-                # M1增速反映流动性，M2增速反映货币供应量
-                if m1_growth > 15 or m2_growth > 12:      # 货币宽松
-                    df.at[i, 'money_policy_signal'] = 1
-                elif m1_growth > 20 or m2_growth > 15:    # 非常宽松
-                    df.at[i, 'money_policy_signal'] = 2
-                elif m1_growth < 5 or m2_growth < 6:      # 货币紧缩
-                    df.at[i, 'money_policy_signal'] = -1
-                elif m1_growth < 2 or m2_growth < 3:      # 非常紧缩
-                    df.at[i, 'money_policy_signal'] = -2
+        m1_growth = df['m1_growth'].to_numpy(dtype=np.float64)
+        m2_growth = df['m2_growth'].to_numpy(dtype=np.float64)
+        valid = ~np.isnan(m1_growth) & ~np.isnan(m2_growth)
+        # M1增速反映流动性，M2增速反映货币供应量；极端档位先于一般档位判断
+        df['money_policy_signal'] = np.select(
+            [valid & ((m1_growth > 20) | (m2_growth > 15)),   # 非常宽松
+             valid & ((m1_growth > 15) | (m2_growth > 12)),   # 货币宽松
+             valid & ((m1_growth < 2) | (m2_growth < 3)),     # 非常紧缩
+             valid & ((m1_growth < 5) | (m2_growth < 6))],    # 货币紧缩
+            [2, 1, -2, -1], default=0)
     
     # 3. 经济景气信号（基于PMI）
     if 'pmi' in df.columns:
-        for i in range(len(df)):
-            pmi = df['pmi'].iloc[i]
-            if pd.notna(pmi):
-                if pmi > 52:       # 经济扩张强劲
-                    df.at[i, 'economic_signal'] = 2
-                elif pmi > 50:     # 经济扩张
-                    df.at[i, 'economic_signal'] = 1
-                elif pmi < 48:     # 经济收缩
-                    df.at[i, 'economic_signal'] = -1
-                elif pmi < 45:     # 经济衰退
-                    df.at[i, 'economic_signal'] = -2
+        pmi = df['pmi'].to_numpy(dtype=np.float64)
+        df['economic_signal'] = np.select(
+            [pmi > 52,     # 经济扩张强劲
+             pmi > 50,     # 经济扩张
+             pmi < 45,     # 经济衰退
+             pmi < 48],    # 经济收缩
+            [2, 1, -2, -1], default=0)
     
     # 4. 全球环境信号（基于美元指数变化）
     if 'usd_index' in df.columns:
         df['usd_change_20d'] = df['usd_index'].pct_change(20) * 100  # 20日变化率
-        
-        for i in range(20, len(df)):  # 从第20行开始计算
-            usd_change = df['usd_change_20d'].iloc[i]
-            if pd.notna(usd_change):
-                if usd_change < -3:      # 美元大幅走弱，利好新兴市场
-                    df.at[i, 'global_signal'] = 2
-                elif usd_change < -1:    # 美元走弱
-                    df.at[i, 'global_signal'] = 1
-                elif usd_change > 3:     # 美元大幅走强
-                    df.at[i, 'global_signal'] = -2
-                elif usd_change > 1:     # 美元走强
-                    df.at[i, 'global_signal'] = -1
+        usd_change = df['usd_change_20d'].to_numpy(dtype=np.float64)
+        df['global_signal'] = np.select(
+            [usd_change < -3,      # 美元大幅走弱，利好新兴市场
+             usd_change < -1,      # 美元走弱
+             usd_change > 3,       # 美元大幅走强
+             usd_change > 1],      # 美元走强
+            [2, 1, -2, -1], default=0)
     
     # 计算综合宏观信号
     df['macro_total_signal'] = (df['interest_rate_signal'] + 
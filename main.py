@@ -1,13 +1,13 @@
-import json
-from fund import send_drawdown_analysis, analyze_drawdown_strategy, plot_drawdown_hist, plot_fund_price_change_distribution, plot_shanghai_volume_trend
+import orjson
+from fund import send_drawdown_analysis_batch, analyze_drawdown_strategy, plot_drawdown_hist, plot_fund_price_change_distribution, plot_shanghai_volume_trend
 from stock import analyze_stock_drawdown_strategy, plot_stock_drawdown_hist, plot_stock_price_change_distribution
 
 
 def load_config():
     """加载配置文件"""
     try:
-        with open('config.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
+        with open('config.json', 'rb') as f:
+            return orjson.loads(f.read())
     except Exception as e:
         print(f"读取配置文件失败: {e}")
         return None
@@ -31,19 +31,14 @@ def send_all_notifications():
         return
 
     total_notifications = len(bark_urls) * len(fund_codes)
-    current = 0
 
     print(f"准备发送 {total_notifications} 个通知...")
 
-    for bark_url in bark_urls:
-        print(f"\n正在向 {bark_url} 发送通知...")
-        for fund_code in fund_codes:
-            current += 1
-            print(f"[{current}/{total_notifications}] 发送基金 {fund_code} 的分析...")
-
-            success = send_drawdown_analysis(bark_url, fund_code)
-            if not success:
-                print(f"发送失败: {fund_code} -> {bark_url}")
+    # 名称映射预先补全、每只基金只分析一次，推送请求并行发送
+    results = send_drawdown_analysis_batch(bark_urls, fund_codes, max_workers=16)
+    failed = [fund_code for fund_code, success in results.items() if not success]
+    if failed:
+        print(f"以下基金存在发送失败: {', '.join(failed)}")
 
     print(f"\n通知发送完成！共发送 {total_notifications} 个通知。")
 
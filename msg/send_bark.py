@@ -1,4 +1,12 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 复用连接的会话，多条推送共享keep-alive连接，失败时自动重试
+_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=Retry(total=2, backoff_factor=0.3))
+_SESSION.mount('https://', _ADAPTER)
+_SESSION.mount('http://', _ADAPTER)
 
 
 def send_bark(bark_url: str, title: str, content: str):
@@ -16,7 +24,7 @@ def send_bark(bark_url: str, title: str, content: str):
     notification_url = f"{bark_url}{title}/{content}"
     
     try:
-        response = requests.get(notification_url)
+        response = _SESSION.get(notification_url, timeout=5)
         if response.status_code == 200:
             print(f"✅ 成功发送通知: {title}")
             return True
@@ -1,9 +1,84 @@
 import akshare as ak
 import pandas as pd
 import os
-import json
-import glob
+import time
+import atexit
+import orjson
 from datetime import datetime
+from functools import lru_cache
+
+
+_STOCK_INFO_CACHE_FILE = "data/stock_info_cache.feather"
+_STOCK_INFO_TTL = 24 * 3600
+
+# 股票映射进程内只读取一次，修改后在进程退出时统一写回
+_MAPPING_FILE = "data/stock_mapping.parquet"
+_LEGACY_MAPPING_FILE = "data/stock_mapping.json"
+_MAPPING = None
+_DIRTY = False
+
+
+def _get_mapping() -> dict:
+    """
+    获取股票映射，首次调用时从映射文件加载
+    :return: 股票代码 -> 股票名称
+    """
+    global _MAPPING, _DIRTY
+    if _MAPPING is None:
+        _MAPPING = {}
+        try:
+            if os.path.exists(_MAPPING_FILE):
+                _MAPPING = pd.read_parquet(_MAPPING_FILE).set_index('code')['name'].to_dict()
+            elif os.path.exists(_LEGACY_MAPPING_FILE):
+                # 旧版json映射：读取后标记为已修改，退出时迁移为parquet
+                with open(_LEGACY_MAPPING_FILE, 'rb') as f:
+                    _MAPPING = orjson.loads(f.read())
+                _DIRTY = bool(_MAPPING)
+        except Exception:
+            pass
+    return _MAPPING
+
+
+def _flush_mapping():
+    """
+    将有改动的股票映射写回parquet映射文件（进程退出时调用）
+    """
+    global _DIRTY
+    if not _DIRTY:
+        return
+    try:
+        os.makedirs(os.path.dirname(_MAPPING_FILE), exist_ok=True)
+        pd.DataFrame(list(_MAPPING.items()), columns=['code', 'name']).to_parquet(_MAPPING_FILE, compression='zstd')
+        _DIRTY = False
+        if os.path.exists(_LEGACY_MAPPING_FILE):
+            os.remove(_LEGACY_MAPPING_FILE)
+    except Exception as e:
+        print(f"保存映射文件失败: {e}")
+
+
+atexit.register(_flush_mapping)
+
+
+@lru_cache(maxsize=1)
+def _all_stock_info() -> pd.DataFrame:
+    """
+    获取全部A股代码与名称（以code为索引），每个进程只加载一次；
+    本地缓存24小时内有效，避免每次启动都拉取全市场列表
+    :return: 以code为索引、包含name列的DataFrame
+    """
+    if os.path.exists(_STOCK_INFO_CACHE_FILE) and time.time() - os.path.getmtime(_STOCK_INFO_CACHE_FILE) < _STOCK_INFO_TTL:
+        try:
+            return pd.read_feather(_STOCK_INFO_CACHE_FILE).set_index('code')
+        except Exception as e:
+            print(f"读取股票列表缓存失败: {e}")
+    
+    stock_info = ak.stock_info_a_code_name()
+    try:
+        os.makedirs(os.path.dirname(_STOCK_INFO_CACHE_FILE), exist_ok=True)
+        stock_info.reset_index(drop=True).to_feather(_STOCK_INFO_CACHE_FILE, compression='zstd')
+    except Exception as e:
+        print(f"写入股票列表缓存失败: {e}")
+    return stock_info.set_index('code')
 
 
 def update_stock_mapping(stock_code: str, stock_name: str = None):
@@ -12,16 +87,10 @@ def update_stock_mapping(stock_code: str, stock_name: str = None):
     :param stock_code: 股票代码
     :param stock_name: 股票名称，如果为None则尝试查询
     """
-    mapping_file = "data/stock_mapping.json"
+    global _DIRTY
     
-    # 读取现有映射
-    stock_mapping = {}
-    if os.path.exists(mapping_file):
-        try:
-            with open(mapping_file, 'r', encoding='utf-8') as f:
-                stock_mapping = json.load(f)
-        except Exception:
-            pass
+    # 读取现有映射（进程内只加载一次）
+    stock_mapping = _get_mapping()
     
     # 如果映射中已存在，跳过
     if stock_code in stock_mapping:
@@ -30,34 +99,48 @@ def update_stock_mapping(stock_code: str, stock_name: str = None):
     # 如果没有提供股票名称，尝试查询
     if stock_name is None:
         try:
-            stock_info = ak.stock_info_a_code_name()
-            matching_stocks = stock_info[stock_info['code'] == stock_code]
-            
-            if not matching_stocks.empty:
-                stock_name = matching_stocks.iloc[0]['name']
+            stock_info = _all_stock_info()
+            if stock_code in stock_info.index:
+                stock_name = stock_info.at[stock_code, 'name']
                 print(f"查询到股票名称: {stock_name}")
         except Exception as e:
             print(f"查询股票{stock_code}名称失败: {e}")
             return stock_code
     
-    # 更新映射并保存
+    # 更新映射，进程退出时统一写回映射文件
     if stock_name and stock_name != stock_code:
         stock_mapping[stock_code] = stock_name
-        try:
-            os.makedirs(os.path.dirname(mapping_file), exist_ok=True)
-            with open(mapping_file, 'w', encoding='utf-8') as f:
-                json.dump(stock_mapping, f, ensure_ascii=False, indent=2)
-            print(f"已将{stock_code}:{stock_name}保存到映射文件")
-        except Exception as e:
-            print(f"保存映射文件失败: {e}")
+        _DIRTY = True
+        print(f"已将{stock_code}:{stock_name}加入映射，退出时保存到映射文件")
         return stock_name
     
     return stock_code
 
 
+def _remove_legacy_price_caches(stock_code: str):
+    """
+    单次扫描data目录，删除该股票旧版按日期命名的json价格缓存（已由feather缓存取代）
+    :param stock_code: 股票代码
+    """
+    prefix = f"stock_{stock_code}_"
+    try:
+        with os.scandir('data') as it:
+            old_files = [entry.path for entry in it
+                         if entry.name.startswith(prefix) and entry.name.endswith('_price.json')]
+    except FileNotFoundError:
+        return
+    
+    for old_file in old_files:
+        try:
+            os.remove(old_file)
+            print(f"删除旧缓存文件: {old_file}")
+        except Exception as e:
+            print(f"删除旧缓存文件{old_file}失败: {e}")
+
+
 def get_stock_price_by_date(stock_code: str, date_str: str = None) -> pd.DataFrame:
     """
-    优先从本地json缓存读取股票价格数据，如无则用akshare获取并缓存。
+    优先从本地feather缓存读取股票价格数据，如无则用akshare获取并缓存。
     获取股票历史价格数据（前复权）。
     :param stock_code: 股票代码，如 '000001'
     :param date_str: 日期字符串，格式为 'YYYY-MM-DD'，如果为None则使用今日
@@ -66,29 +149,18 @@ def get_stock_price_by_date(stock_code: str, date_str: str = None) -> pd.DataFra
     if date_str is None:
         date_str = datetime.now().strftime('%Y-%m-%d')
     
-    cache_file = f"data/stock_{stock_code}_{date_str}_price.json"
+    # 每只股票只保留一个缓存文件，以文件修改日期判断是否为当日数据
+    cache_file = f"data/stock_{stock_code}.feather"
     # 优先尝试读取本地缓存
-    if os.path.exists(cache_file):
-        try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            df = pd.DataFrame(data)
-            if not df.empty and '收盘' in df.columns:
+    try:
+        if os.path.exists(cache_file) and datetime.fromtimestamp(os.path.getmtime(cache_file)).strftime('%Y-%m-%d') == date_str:
+            df = pd.read_feather(cache_file)
+            if not df.empty and '收盘价' in df.columns:
                 # 即使使用缓存，也尝试更新股票映射（如果映射不存在）
                 update_stock_mapping(stock_code)
                 return df
-        except Exception as e:
-            print(f"读取本地缓存{cache_file}失败: {e}")
-    
-    # 删除该股票的旧日期缓存文件
-    old_cache_pattern = f"data/stock_{stock_code}_*_price.json"
-    for old_file in glob.glob(old_cache_pattern):
-        if old_file != cache_file:  # 不删除当前日期的文件
-            try:
-                os.remove(old_file)
-                print(f"删除旧缓存文件: {old_file}")
-            except Exception as e:
-                print(f"删除旧缓存文件{old_file}失败: {e}")
+    except Exception as e:
+        print(f"读取本地缓存{cache_file}失败: {e}")
     
     # 本地无有效缓存，尝试akshare获取
     try:
@@ -108,7 +180,9 @@ def get_stock_price_by_date(stock_code: str, date_str: str = None) -> pd.DataFra
         # 写入本地缓存
         try:
             os.makedirs(os.path.dirname(cache_file), exist_ok=True)
-            df.to_json(cache_file, orient='records', force_ascii=False)
+            df.reset_index(drop=True).to_feather(cache_file, compression='zstd')
+            # feather缓存写入成功后清理旧版json缓存
+            _remove_legacy_price_caches(stock_code)
         except Exception as e:
             print(f"写入本地缓存{cache_file}失败: {e}")
         return df
@@ -1,36 +1,141 @@
+import sys
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
+from functools import lru_cache
+from numba import njit, prange
 from .data_fetcher import get_stock_price_by_date
 
 
-def calculate_stock_drawdown(df, stock_code: str = "", silent: bool = False, recent_days: int = None):
+@njit(cache=True)
+def _drawdown_kernel(price: np.ndarray):
     """
-    通用的股票回撤计算函数
+    单次遍历价格序列，同时计算回撤率和各项统计量（缺失价格对应的回撤为NaN且不计入统计）
+    :param price: 收盘价数组
+    :return: (回撤率数组, 非零回撤数组, 最大回撤, 平均回撤, 回撤标准差, 零回撤个数, 非零回撤中 <= 当前回撤的个数)
+    """
+    n = price.shape[0]
+    drawdown = np.empty(n)
+    # 非零回撤在同一遍中顺带收集，无需再用布尔掩码筛选一次
+    non_zero = np.empty(n)
+    # 当前回撤只取决于全局最高价和最新价格，先求出来以便在同一遍中统计排名
+    peak = np.nan
+    for i in range(n):
+        if price[i] == price[i] and (peak != peak or price[i] > peak):
+            peak = price[i]
+    current = (peak - price[n - 1]) / peak * 100
+    
+    running_max = np.nan
+    max_dd = np.nan
+    sum_dd = 0.0
+    sumsq_dd = 0.0
+    n_valid = 0
+    n_zero = 0
+    n_non_zero = 0
+    n_le = 0
+    for i in range(n):
+        p = price[i]
+        # 跳过缺失值的历史最高价格（与np.fmax.accumulate一致）
+        if p == p and (running_max != running_max or p > running_max):
+            running_max = p
+        # 回撤率 = (历史最高价格 - 当前价格) / 历史最高价格 * 100%
+        dd = (running_max - p) / running_max * 100
+        drawdown[i] = dd
+        if dd != dd:
+            continue
+        n_valid += 1
+        sum_dd += dd
+        sumsq_dd += dd * dd
+        if max_dd != max_dd or dd > max_dd:
+            max_dd = dd
+        if dd == 0:
+            n_zero += 1
+        elif dd > 0:
+            non_zero[n_non_zero] = dd
+            n_non_zero += 1
+            if dd <= current:
+                n_le += 1
+    
+    mean_dd = sum_dd / n_valid if n_valid > 0 else np.nan
+    std_dd = np.sqrt(max(sumsq_dd - sum_dd * mean_dd, 0.0) / (n_valid - 1)) if n_valid > 1 else np.nan
+    return drawdown, non_zero[:n_non_zero], max_dd, mean_dd, std_dd, n_zero, n_le
+
+
+@njit(parallel=True, cache=True)
+def _drawdown_batch_kernel(prices: np.ndarray, offsets: np.ndarray):
+    """
+    按股票并行计算多只股票的回撤率和统计量
+    :param prices: 所有股票收盘价首尾相接的一维数组
+    :param offsets: 各股票在prices中的起止位置，长度为股票数+1
+    :return: (回撤率数组, 统计矩阵) 统计矩阵每行为 最大回撤、平均回撤、回撤标准差、零回撤比例、当前回撤、当前回撤百分位
+    """
+    n_stocks = offsets.shape[0] - 1
+    drawdowns = np.empty(prices.shape[0])
+    stats = np.full((n_stocks, 6), np.nan)
+    for k in prange(n_stocks):
+        start, end = offsets[k], offsets[k + 1]
+        if end <= start:
+            continue
+        drawdown, non_zero, max_dd, mean_dd, std_dd, n_zero, n_le = _drawdown_kernel(prices[start:end])
+        drawdowns[start:end] = drawdown
+        stats[k, 0] = max_dd
+        stats[k, 1] = mean_dd
+        stats[k, 2] = std_dd
+        stats[k, 3] = n_zero / (end - start) * 100
+        stats[k, 4] = drawdown[-1]
+        if non_zero.shape[0] > 0:
+            stats[k, 5] = n_le / non_zero.shape[0] * 100
+    return drawdowns, stats
+
+
+def _sort_by_date(df):
+    """
+    将'价格日期'列规整为datetime并按日期升序排列
+    :param df: 包含'价格日期'列的DataFrame
+    :return: 按日期升序的DataFrame
+    """
+    # 确保日期列为datetime格式：按列类型分别处理，不靠异常试错
+    date_col = df['价格日期']
+    if pd.api.types.is_datetime64_any_dtype(date_col):
+        pass
+    elif pd.api.types.is_numeric_dtype(date_col):
+        # 数值视为时间戳（毫秒）
+        df['价格日期'] = pd.to_datetime(date_col, unit='ms')
+    else:
+        try:
+            # 字符串或日期对象按ISO格式直接解析
+            df['价格日期'] = pd.to_datetime(date_col, format='ISO8601', cache=True)
+        except Exception as e:
+            raise ValueError(f"日期解析失败: {e}")
+    
+    # 数据源一般已按日期升序，只有乱序时才排序（mergesort稳定，且对近乎有序的数据更快）
+    if not df['价格日期'].is_monotonic_increasing:
+        df = df.sort_values('价格日期', kind='mergesort')
+    
+    return df
+
+
+def _select_prices(df, stock_code: str = "", silent: bool = False, recent_days: int = None):
+    """
+    校验并整理价格数据，按recent_days截取后返回收盘价数组
     :param df: 包含价格数据的DataFrame，必须有'收盘价'和'价格日期'列
     :param stock_code: 股票代码，用于提示信息
     :param silent: 是否静默模式（不打印输出）
     :param recent_days: 如果指定，则只使用最近N天的数据；如果为None则使用所有数据
-    :return: (df_to_use, drawdown) 使用的数据和回撤率序列
+    :return: (df_to_use, price) 使用的数据和收盘价数组
     """
     if df.empty or '收盘价' not in df.columns or '价格日期' not in df.columns:
         raise ValueError(f"数据无效，缺少必要列")
     
-    # 确保日期列为datetime格式
-    try:
-        # 尝试作为时间戳解析（毫秒）
-        df['价格日期'] = pd.to_datetime(df['价格日期'], unit='ms')
-    except ValueError:
-        try:
-            # 如果失败，尝试直接解析字符串格式日期
-            df['价格日期'] = pd.to_datetime(df['价格日期'])
-        except Exception as e:
-            raise ValueError(f"日期解析失败: {e}")
+    df = _sort_by_date(df)
     
-    df = df.sort_values('价格日期')
+    # 回撤百分比用float32精度足够，连续数组减半内存带宽；回撤结果与统计量在内核中按float64累计
+    price = np.ascontiguousarray(df['收盘价'].to_numpy(dtype=np.float32))
     
     # 如果指定了recent_days，则只取最近N天的数据；否则使用所有数据
     if recent_days is not None:
         df_to_use = df.tail(recent_days)
+        price = price[len(price) - len(df_to_use):]
         if not silent and stock_code:
             print(f"使用股票{stock_code}最近{recent_days}天的数据计算回撤。")
     else:
@@ -38,52 +143,120 @@ def calculate_stock_drawdown(df, stock_code: str = "", silent: bool = False, rec
         if not silent and stock_code:
             print(f"使用股票{stock_code}所有历史数据计算回撤。")
     
-    price = df_to_use['收盘价'].astype(float)
-    # 计算到当前日期为止的历史最高价格（包括当前日期）
-    running_max = price.expanding().max()
-    # 回撤率 = (历史最高价格 - 当前价格) / 历史最高价格 * 100%
-    drawdown = (running_max - price) / running_max * 100
-    
+    return df_to_use, price
+
+
+# 只保留最近使用的若干只股票，全市场扫描时内存不会随股票数量无限增长
+@lru_cache(maxsize=256)
+def _load_stock_prices(stock_code: str, day: str):
+    """
+    按(股票代码, 日期)缓存解析并排好序的价格数据，同一进程内重复分析同一只股票时不再重复读取和解析
+    :param stock_code: 股票代码
+    :param day: 日期字符串，格式为 'YYYY-MM-DD'
+    :return: 按日期升序的DataFrame（缓存对象本身，只在本模块内使用）
+    """
+    df = get_stock_price_by_date(stock_code, day)
+    if df.empty or '收盘价' not in df.columns or '价格日期' not in df.columns:
+        # 失败时抛异常而不是返回空表，lru_cache不会缓存异常，下次调用仍会重新获取
+        raise ValueError("数据无效，缺少必要列")
+    return _sort_by_date(df)
+
+
+def get_cached_stock_prices(stock_code: str):
+    """
+    获取当日的股票价格数据，进程内按股票代码缓存
+    :param stock_code: 股票代码
+    :return: 按日期升序的DataFrame（缓存数据的副本，调用方修改不会影响缓存）
+    """
+    return _load_stock_prices(stock_code, datetime.now().strftime('%Y-%m-%d')).copy()
+
+
+def clear_cache():
+    """
+    清空进程内的股票价格缓存
+    """
+    _load_stock_prices.cache_clear()
+
+
+def calculate_stock_drawdown(df, stock_code: str = "", silent: bool = False, recent_days: int = None):
+    """
+    通用的股票回撤计算函数
+    :param df: 包含价格数据的DataFrame，必须有'收盘价'和'价格日期'列
+    :param stock_code: 股票代码，用于提示信息
+    :param silent: 是否静默模式（不打印输出）
+    :param recent_days: 如果指定，则只使用最近N天的数据；如果为None则使用所有数据
+    :return: (df_to_use, drawdown) 使用的数据和回撤率数组（np.ndarray）
+    """
+    df_to_use, price = _select_prices(df, stock_code, silent, recent_days)
+    drawdown = _drawdown_kernel(price)[0]
     return df_to_use, drawdown
 
 
-def analyze_stock_drawdown_strategy(stock_code: str, silent: bool = False, recent_days: int = None):
+def drawdown_batch(prices_list):
+    """
+    批量计算多只股票的回撤率及统计量，按股票多核并行，适合全市场扫描
+    :param prices_list: 各股票按日期升序的收盘价数组列表
+    :return: (drawdowns, stats) 回撤率数组列表，以及每只股票一行的统计DataFrame
+    """
+    prices = [np.asarray(p, dtype=np.float32) for p in prices_list]
+    offsets = np.zeros(len(prices) + 1, dtype=np.int64)
+    np.cumsum([len(p) for p in prices], out=offsets[1:])
+    flat = np.concatenate(prices) if prices else np.empty(0, dtype=np.float32)
+    
+    drawdowns, stats = _drawdown_batch_kernel(flat, offsets)
+    stats = pd.DataFrame(stats, columns=['最大回撤', '平均回撤', '回撤标准差', '零回撤比例', '当前回撤', '当前回撤百分位'])
+    return np.split(drawdowns, offsets[1:-1]), stats
+
+
+def analyze_stock_drawdown_strategy(stock_code: str, silent: bool = False, recent_days: int = None,
+                                    stats_detail: bool = False):
     """
     分析股票回撤率统计信息，提供买入建议
     :param recent_days:
     :param stock_code: 股票代码
     :param silent: 是否静默模式（不打印输出）
+    :param stats_detail: 静默模式下是否仍计算历史回撤统计（分位数等），为False时返回的stats为None
     """
-    df = get_stock_price_by_date(stock_code)
     try:
-        df_to_use, drawdown = calculate_stock_drawdown(df, stock_code, silent, recent_days)
+        df = get_cached_stock_prices(stock_code)
+        df_to_use, price = _select_prices(df, stock_code, silent, recent_days)
     except ValueError as e:
         print(f"无法分析股票{stock_code}，{e}")
         return
     
+    # 一次遍历得到回撤率及除分位数外的全部统计量
+    drawdown, non_zero_drawdown, max_dd, mean_dd, std_dd, n_zero, n_le = _drawdown_kernel(price)
+    n_non_zero = len(non_zero_drawdown)
     
     # 当前回撤率
-    current_drawdown = drawdown.iloc[-1]
-    
-    # 历史回撤统计 - 使用非零回撤数据计算分位数
-    non_zero_drawdown = drawdown[drawdown > 0]
-    zero_ratio = (drawdown == 0).mean()
+    current_drawdown = drawdown[-1]
     
-    drawdown_stats = {
-        '最大回撤': drawdown.max(),
-        '平均回撤': drawdown.mean(),
-        '回撤标准差': drawdown.std(),
-        '5%分位数': non_zero_drawdown.quantile(0.05) if len(non_zero_drawdown) > 0 else 0.0,
-        '10%分位数': non_zero_drawdown.quantile(0.10) if len(non_zero_drawdown) > 0 else 0.0,
-        '25%分位数': non_zero_drawdown.quantile(0.25) if len(non_zero_drawdown) > 0 else 0.0,
-        '50%分位数': non_zero_drawdown.median() if len(non_zero_drawdown) > 0 else 0.0,
-        '75%分位数': non_zero_drawdown.quantile(0.75) if len(non_zero_drawdown) > 0 else 0.0,
-        '零回撤比例': zero_ratio * 100,
-        '当前回撤': current_drawdown
-    }
+    # 历史回撤统计 - 只在需要输出或调用方要求时计算（分位数需要排序，仍用NumPy）
+    drawdown_stats = None
+    if not silent or stats_detail:
+        if n_non_zero > 0:
+            q05, q10, q25, q50, q75 = np.quantile(non_zero_drawdown, [0.05, 0.10, 0.25, 0.50, 0.75])
+        else:
+            q05 = q10 = q25 = q50 = q75 = 0.0
+        
+        drawdown_stats = {
+            '最大回撤': max_dd,
+            '平均回撤': mean_dd,
+            '回撤标准差': std_dd,
+            '5%分位数': q05,
+            '10%分位数': q10,
+            '25%分位数': q25,
+            '50%分位数': q50,
+            '75%分位数': q75,
+            '零回撤比例': n_zero / len(drawdown) * 100,
+            '当前回撤': current_drawdown
+        }
     
-    # 计算当前回撤的百分位排名
-    current_percentile = (non_zero_drawdown <= current_drawdown).mean() * 100
+    # 计算当前回撤的百分位排名（非零回撤中 <= 当前回撤的比例）
+    if n_non_zero > 0:
+        current_percentile = n_le / n_non_zero * 100
+    else:
+        current_percentile = np.nan
 
     # 买入建议逻辑（百分位越高越值得买入）
     if current_percentile >= 75:
@@ -109,16 +282,21 @@ def analyze_stock_drawdown_strategy(stock_code: str, silent: bool = False, recen
 
     
     if not silent:
-        print(f"\n=== 股票 {stock_code} 回撤分析 ===")
-        print(f"当前回撤率: {current_drawdown:.2f}%")
-        print(f"当前回撤百分位: {current_percentile:.1f}% (越高表示回撤越大)")
-        print(f"\n历史回撤统计:")
-        for key, value in drawdown_stats.items():
-            print(f"  {key}: {value:.2f}%")
-        print(f"\n=== 买入建议 ===")
-        print(f"建议: {suggestion}")
-        print(f"理由: {reason}")
-        print(f"风险评估: {risk_level}")
+        # 拼好后一次性写出，避免逐行print
+        out = [
+            f"\n=== 股票 {stock_code} 回撤分析 ===",
+            f"当前回撤率: {current_drawdown:.2f}%",
+            f"当前回撤百分位: {current_percentile:.1f}% (越高表示回撤越大)",
+            f"\n历史回撤统计:",
+        ]
+        out.extend(f"  {key}: {value:.2f}%" for key, value in drawdown_stats.items())
+        out += [
+            f"\n=== 买入建议 ===",
+            f"建议: {suggestion}",
+            f"理由: {reason}",
+            f"风险评估: {risk_level}",
+        ]
+        sys.stdout.write("\n".join(out) + "\n")
     
     return {
         'current_drawdown': current_drawdown,
@@ -1,21 +1,77 @@
-import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
 from .data_fetcher import get_stock_price_by_date, update_stock_mapping
-from .drawdown_analyzer import calculate_stock_drawdown, analyze_stock_drawdown_strategy
+from .drawdown_analyzer import calculate_stock_drawdown, analyze_stock_drawdown_strategy, get_cached_stock_prices
 
-# 设置matplotlib中文字体
-plt.rcParams['font.sans-serif'] = ['Heiti TC', 'Arial Unicode MS', 'STHeiti', 'SimHei']
-plt.rcParams['axes.unicode_minus'] = False
+# matplotlib只在第一次绘图时导入，仅导入本模块时不加载
+plt = None
+# 中文字体只在第一次绘图时设置，避免导入模块时就加载matplotlib
+_FONTS_SET = False
 
 
-def plot_stock_price_change_distribution(stock_code: str, recent_days: int = None, query_value: float = None):
+def _setup_fonts():
+    """设置matplotlib中文字体（只执行一次）"""
+    global _FONTS_SET
+    if _FONTS_SET:
+        return
+    import matplotlib
+    matplotlib.rcParams['font.sans-serif'] = ['Heiti TC', 'Arial Unicode MS', 'STHeiti', 'SimHei']
+    matplotlib.rcParams['axes.unicode_minus'] = False
+    _FONTS_SET = True
+
+
+def _mpl():
+    """
+    导入pyplot（只有需要弹出图表窗口时才用到）
+    :return: matplotlib.pyplot模块
+    """
+    global plt
+    if plt is None:
+        import matplotlib.pyplot as _plt
+        plt = _plt
+    return plt
+
+
+def _new_figure(show: bool, **fig_kw):
+    """
+    新建图形
+    :param show: 为True时通过pyplot创建以便弹出窗口；为False时直接创建Figure，保存时使用Agg画布，不经过pyplot和图形界面
+    :param fig_kw: 传给Figure的参数，如figsize
+    :return: Figure
+    """
+    if show:
+        return _mpl().figure(**fig_kw)
+    from matplotlib.figure import Figure
+    return Figure(**fig_kw)
+
+
+def _finish_figure(fig, show: bool, save_path: str = None):
+    """
+    渲染新建的图形，结束后关闭图形
+    :param fig: 图形
+    :param show: 是否弹出图表窗口
+    :param save_path: 保存图片的路径，为None时不保存
+    """
+    fig.tight_layout()
+    if save_path:
+        fig.savefig(save_path, bbox_inches='tight')
+    if show:
+        plt.show()
+        plt.close(fig)
+
+
+def plot_stock_price_change_distribution(stock_code: str, recent_days: int = None, query_value: float = None,
+                                         show: bool = True, save_path: str = None):
     """
     绘制股票在recent_days内的涨跌分布图，并显示分位值线
     :param stock_code: 股票代码
     :param recent_days: 使用最近多少天的数据
     :param query_value: 查询指定涨跌幅值在历史数据中的百分位（如-3.5表示跌幅3.5%）
+    :param show: 是否弹出图表窗口；为False时不经过pyplot和图形界面，适合无界面环境
+    :param save_path: 保存图片的路径，为None时不保存
     """
+    _setup_fonts()
+    
     df = get_stock_price_by_date(stock_code)
     
     if df.empty or '收盘价' not in df.columns:
@@ -44,12 +100,13 @@ def plot_stock_price_change_distribution(stock_code: str, recent_days: int = Non
         title += f"（最近{recent_days}天）"
     
     # 创建分布图
-    plt.figure(figsize=(12, 8))
+    fig = _new_figure(show, figsize=(12, 8))
+    ax = fig.subplots()
     
     # 绘制直方图
     n_bins = min(50, len(daily_returns) // 5)  # 动态调整bins数量
-    plt.hist(daily_returns, bins=n_bins, alpha=0.7, color='skyblue', 
-             edgecolor='black', density=True, label='涨跌幅分布')
+    ax.hist(daily_returns, bins=n_bins, alpha=0.7, color='skyblue', 
+            edgecolor='black', density=True, label='涨跌幅分布')
     
     # 分开计算涨幅和跌幅的分位值线
     gains = daily_returns[daily_returns > 0]  # 涨幅
@@ -62,8 +119,8 @@ def plot_stock_price_change_distribution(stock_code: str, recent_days: int = Non
         
         for i, p in enumerate(gain_percentiles):
             p_value = np.percentile(gains, p)
-            plt.axvline(x=p_value, color=gain_colors[i], linestyle='--', alpha=0.8, linewidth=2,
-                       label=f'涨{p}%分位: {p_value:.2f}%')
+            ax.axvline(x=p_value, color=gain_colors[i], linestyle='--', alpha=0.8, linewidth=2,
+                      label=f'涨{p}%分位: {p_value:.2f}%')
     
     # 跌幅分位值
     if len(losses) > 0:
@@ -72,16 +129,16 @@ def plot_stock_price_change_distribution(stock_code: str, recent_days: int = Non
         
         for i, p in enumerate(loss_percentiles):
             p_value = np.percentile(losses, p)
-            plt.axvline(x=p_value, color=loss_colors[i], linestyle='--', alpha=0.8, linewidth=2,
-                       label=f'跌{p}%分位: {p_value:.2f}%')
+            ax.axvline(x=p_value, color=loss_colors[i], linestyle='--', alpha=0.8, linewidth=2,
+                      label=f'跌{p}%分位: {p_value:.2f}%')
     
     # 添加0线作为参考
-    plt.axvline(x=0, color='black', linestyle='-', alpha=0.5, linewidth=1, label='零线')
+    ax.axvline(x=0, color='black', linestyle='-', alpha=0.5, linewidth=1, label='零线')
     
     # 如果提供了查询值，添加查询线
     if query_value is not None:
-        plt.axvline(x=query_value, color='magenta', linestyle=':', alpha=0.8, linewidth=3,
-                   label=f'查询值: {query_value:.2f}%')
+        ax.axvline(x=query_value, color='magenta', linestyle=':', alpha=0.8, linewidth=3,
+                  label=f'查询值: {query_value:.2f}%')
     
     # 添加统计信息
     mean_return = daily_returns.mean()
@@ -106,10 +163,10 @@ def plot_stock_price_change_distribution(stock_code: str, recent_days: int = Non
         stats_text += f'平盘天数: {flat_days}天\n'
     stats_text += f'总天数: {len(daily_returns)}天'
     
-    plt.text(0.98, 0.95, stats_text, transform=plt.gca().transAxes,
-             verticalalignment='top', horizontalalignment='right',
-             bbox=dict(boxstyle='round', facecolor='lightgray', alpha=0.8),
-             fontsize=10)
+    ax.text(0.98, 0.95, stats_text, transform=ax.transAxes,
+            verticalalignment='top', horizontalalignment='right',
+            bbox=dict(boxstyle='round', facecolor='lightgray', alpha=0.8),
+            fontsize=10)
     
     # 如果提供了查询值，在图上添加交易建议
     if query_value is not None:
@@ -166,18 +223,17 @@ def plot_stock_price_change_distribution(stock_code: str, recent_days: int = Non
         advice_text += f'建议操作: {suggestion}\n'
         advice_text += f'{reason_short}'
         
-        plt.text(0.02, 0.02, advice_text, transform=plt.gca().transAxes,
-                verticalalignment='bottom', horizontalalignment='left',
-                bbox=dict(boxstyle='round,pad=0.5', facecolor=color, alpha=0.2, edgecolor=color),
-                fontsize=10, weight='bold')
+        ax.text(0.02, 0.02, advice_text, transform=ax.transAxes,
+               verticalalignment='bottom', horizontalalignment='left',
+               bbox=dict(boxstyle='round,pad=0.5', facecolor=color, alpha=0.2, edgecolor=color),
+               fontsize=10, weight='bold')
 
-    plt.title(title, fontsize=14)
-    plt.xlabel("涨跌幅 (%)", fontsize=12)
-    plt.ylabel("概率密度", fontsize=12)
-    plt.grid(True, linestyle='--', alpha=0.3)
-    plt.legend(loc='upper left', fontsize=8)
-    plt.tight_layout()
-    plt.show()
+    ax.set_title(title, fontsize=14)
+    ax.set_xlabel("涨跌幅 (%)", fontsize=12)
+    ax.set_ylabel("概率密度", fontsize=12)
+    ax.grid(True, linestyle='--', alpha=0.3)
+    ax.legend(loc='upper left', fontsize=8)
+    _finish_figure(fig, show, save_path)
 
     
     print(f"\n基本统计:")
@@ -282,15 +338,20 @@ def plot_stock_price_change_distribution(stock_code: str, recent_days: int = Non
 
 
 
-def plot_stock_drawdown_hist(stock_code: str, recent_days: int = None, show_percentiles: bool = True):
+def plot_stock_drawdown_hist(stock_code: str, recent_days: int = None, show_percentiles: bool = True,
+                             show: bool = True, save_path: str = None):
     """
     获取股票价格并绘制回撤率与日期的折线图
     :param stock_code: 股票代码
     :param recent_days: 使用最近多少天的数据，默认365天
     :param show_percentiles: 是否显示百分位线
+    :param show: 是否弹出图表窗口；为False时不经过pyplot和图形界面，适合无界面环境
+    :param save_path: 保存图片的路径，为None时不保存
     """
-    df = get_stock_price_by_date(stock_code)
+    _setup_fonts()
+    
     try:
+        df = get_cached_stock_prices(stock_code)
         df_to_use, drawdown = calculate_stock_drawdown(df, stock_code, recent_days=recent_days)
     except ValueError as e:
         print(f"无法绘制股票{stock_code}的回撤图，{e}")
@@ -302,9 +363,10 @@ def plot_stock_drawdown_hist(stock_code: str, recent_days: int = None, show_perc
     if stock_name and stock_name != stock_code:
         title = f"{stock_name}({stock_code})回撤率时间序列图"
     
-    plt.figure(figsize=(12, 6))
-    plt.plot(df_to_use['价格日期'], drawdown, linewidth=1.5, color='red', label='回撤率')
-    plt.fill_between(df_to_use['价格日期'], drawdown, 0, alpha=0.3, color='red')
+    fig = _new_figure(show, figsize=(12, 6))
+    ax = fig.subplots()
+    ax.plot(df_to_use['价格日期'], drawdown, linewidth=1.5, color='red', label='回撤率')
+    ax.fill_between(df_to_use['价格日期'], drawdown, 0, alpha=0.3, color='red')
     
     # 添加百分位线
     if show_percentiles:
@@ -313,31 +375,30 @@ def plot_stock_drawdown_hist(stock_code: str, recent_days: int = None, show_perc
         
         for i, p in enumerate(percentiles):
             p_value = np.percentile(drawdown, p)
-            plt.axhline(y=p_value, color=colors[i], linestyle='--', alpha=0.7, 
-                       label=f'{p}%百分位: {p_value:.2f}%')
+            ax.axhline(y=p_value, color=colors[i], linestyle='--', alpha=0.7, 
+                      label=f'{p}%百分位: {p_value:.2f}%')
     
     # 获取策略分析结果
     strategy_result = analyze_stock_drawdown_strategy(stock_code, silent=True, recent_days=recent_days)
     
     # 在右上角显示当前日期、回撤率和策略建议
     current_date = df_to_use['价格日期'].iloc[-1].strftime('%Y-%m-%d')
-    current_drawdown = drawdown.iloc[-1]
+    current_drawdown = drawdown[-1]
     
     info_text = f'当前日期: {current_date}\n当前回撤: {current_drawdown:.2f}%\n\n'
     info_text += f'建议: {strategy_result["suggestion"]}\n'
     info_text += f'理由: {strategy_result["reason"]}\n'
     info_text += f'风险评估: {strategy_result["risk_level"]}'
     
-    plt.text(0.98, 0.95, info_text, transform=plt.gca().transAxes, 
-             verticalalignment='top', horizontalalignment='right',
-             bbox=dict(boxstyle='round', facecolor='lightblue', alpha=0.8),
-             fontsize=9)
+    ax.text(0.98, 0.95, info_text, transform=ax.transAxes, 
+            verticalalignment='top', horizontalalignment='right',
+            bbox=dict(boxstyle='round', facecolor='lightblue', alpha=0.8),
+            fontsize=9)
     
-    plt.title(title)
-    plt.xlabel("日期")
-    plt.ylabel("回撤率 (%)")
-    plt.grid(True, linestyle='--', alpha=0.5)
-    plt.xticks(rotation=45)
-    plt.legend(loc='upper left')
-    plt.tight_layout()
-    plt.show()
\ No newline at end of file
+    ax.set_title(title)
+    ax.set_xlabel("日期")
+    ax.set_ylabel("回撤率 (%)")
+    ax.grid(True, linestyle='--', alpha=0.5)
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.legend(loc='upper left')
+    _finish_figure(fig, show, save_path)
\ No newline at end of file
@@ -6,106 +6,135 @@
 
 import pandas as pd
 import numpy as np
+import sys
 from datetime import datetime, timedelta
+from functools import lru_cache
 import matplotlib.pyplot as plt
 
 plt.rcParams['font.sans-serif'] = ['Heiti TC', 'Arial Unicode MS', 'STHeiti', 'SimHei']
 plt.rcParams['axes.unicode_minus'] = False
 
 
-def create_5year_historical_data():
+_HIST_SEED = 2024
+_PLOT_MAX_POINTS = 2000
+
+# 模拟不同时间范围的历史分位数
+_TIMEFRAMES = {
+    "10年视角(2014-2024)": {
+        "historical_range": (-5.5, 1.0),
+        "percentile": 5,  # 极度低估
+        "allocation": "股票80%",
+        "reason": "包含2015牛市和2018熊市，范围更大"
+    },
+    "5年视角(2019-2024)": {
+        "historical_range": (-4.8, -1.2),  
+        "percentile": 15,  # 低估
+        "allocation": "股票70%", 
+        "reason": "主要是疫情后低利率时代，相对温和"
+    },
+    "3年视角(2021-2024)": {
+        "historical_range": (-4.2, -2.1),
+        "percentile": 25,  # 合理偏低
+        "allocation": "股票60%",
+        "reason": "近期震荡市，当前相对合理"
+    }
+}
+
+
+@lru_cache(maxsize=4)
+def _load_5year_historical_data(seed):
     """
-    构建2019-2024年5年历史股债数据
-    基于关键市场事件和实际走势
+    按随机种子生成5年历史数据，只在进程内缓存
+    （生成只需几毫秒，不落盘，修改下面的均值/标准差表后不会读到旧数据）
+    :param seed: 随机种子
+    :return: 历史数据 DataFrame（缓存对象，调用方不要直接修改）
     """
-    
     # 创建月度数据点 (2019年12月 - 2024年12月，共61个月)
     dates = pd.date_range('2019-12-31', '2024-12-31', freq='M')
-    
-    # 5年内关键时期的PE和债券收益率
-    historical_data = []
-    
-    for i, date in enumerate(dates):
-        year = date.year
-        month = date.month
-        
-        # PE估值变化（基于真实市场情况）
-        if year == 2019:  # 2019年结构性牛市后期
-            pe = 17.5 + np.random.normal(0, 1)
-        elif year == 2020:  # 2020年疫情年
-            if month <= 3:  # Q1疫情恐慌
-                pe = 12.0 + np.random.normal(0, 1)
-            elif month <= 8:  # 流动性宽松，估值修复
-                pe = 19.0 + np.random.normal(0, 1.5)
-            else:  # 下半年高估值
-                pe = 21.0 + np.random.normal(0, 1)
-        elif year == 2021:  # 2021年结构牛市顶部
-            if month <= 2:  # 春节前高点
-                pe = 22.0 + np.random.normal(0, 1.5)
-            else:  # 逐步回落
-                pe = 18.0 + np.random.normal(0, 2)
-        elif year == 2022:  # 2022年熊市
-            if month <= 4:  # 上半年快速下跌
-                pe = 15.0 + np.random.normal(0, 1.5)
-            elif month <= 10:  # 持续低迷
-                pe = 12.5 + np.random.normal(0, 1)
-            else:  # 年底反弹
-                pe = 14.0 + np.random.normal(0, 1)
-        elif year == 2023:  # 2023年修复年
-            pe = 15.0 + np.random.normal(0, 1.5)
-        else:  # 2024年震荡
-            pe = 15.2 + np.random.normal(0, 1)
-        
-        pe = max(10, min(pe, 30))  # PE限制在合理范围
-        
-        # 债券收益率变化（基于实际利率走势）
-        if year == 2019:
-            bond_yield = 3.15 + np.random.normal(0, 0.1)
-        elif year == 2020:  # 疫情后货币宽松
-            if month <= 6:
-                bond_yield = 2.8 + np.random.normal(0, 0.15)
-            else:
-                bond_yield = 3.2 + np.random.normal(0, 0.1)
-        elif year == 2021:  # 通胀预期升温
-            bond_yield = 3.1 + np.random.normal(0, 0.2)
-        elif year == 2022:  # 经济下行压力
-            bond_yield = 2.75 + np.random.normal(0, 0.15)
-        elif year == 2023:  # 宽松延续
-            bond_yield = 2.6 + np.random.normal(0, 0.1)
-        else:  # 2024年历史低位
-            if month <= 11:
-                bond_yield = 2.2 + np.random.normal(0, 0.1)
-            else:  # 12月跌破2%
-                bond_yield = 1.95 + np.random.normal(0, 0.05)
-        
-        bond_yield = max(1.5, min(bond_yield, 4.0))
-        
-        # 计算股债利差
-        stock_yield = 100 / pe
-        spread = bond_yield - stock_yield
-        
-        historical_data.append({
-            'date': date,
-            'pe': pe,
-            'bond_yield': bond_yield,
-            'stock_yield': stock_yield,
-            'spread': spread,
-            'year': year
-        })
-    
-    return pd.DataFrame(historical_data)
+    years = dates.year.to_numpy()
+    months = dates.month.to_numpy()
+
+    # PE估值变化（基于真实市场情况），按时期给出均值和标准差
+    pe_conds = [
+        years == 2019,                                  # 2019年结构性牛市后期
+        (years == 2020) & (months <= 3),                # 2020年Q1疫情恐慌
+        (years == 2020) & (months <= 8),                # 流动性宽松，估值修复
+        years == 2020,                                  # 下半年高估值
+        (years == 2021) & (months <= 2),                # 2021年春节前高点
+        years == 2021,                                  # 逐步回落
+        (years == 2022) & (months <= 4),                # 2022年上半年快速下跌
+        (years == 2022) & (months <= 10),               # 持续低迷
+        years == 2022,                                  # 年底反弹
+        years == 2023,                                  # 2023年修复年
+    ]
+    pe_means = np.select(pe_conds, [17.5, 12.0, 19.0, 21.0, 22.0, 18.0, 15.0, 12.5, 14.0, 15.0], default=15.2)  # 2024年震荡
+    pe_stds = np.select(pe_conds, [1, 1, 1.5, 1, 1.5, 2, 1.5, 1, 1, 1.5], default=1)
+
+    # 债券收益率变化（基于实际利率走势）
+    bond_conds = [
+        years == 2019,
+        (years == 2020) & (months <= 6),                # 疫情后货币宽松
+        years == 2020,
+        years == 2021,                                  # 通胀预期升温
+        years == 2022,                                  # 经济下行压力
+        years == 2023,                                  # 宽松延续
+        months <= 11,                                   # 2024年历史低位
+    ]
+    bond_means = np.select(bond_conds, [3.15, 2.8, 3.2, 3.1, 2.75, 2.6, 2.2], default=1.95)  # 12月跌破2%
+    bond_stds = np.select(bond_conds, [0.1, 0.15, 0.1, 0.2, 0.15, 0.1, 0.1], default=0.05)
+
+    # 一次性抽取全部噪声，按各时期的标准差缩放
+    rng = np.random.default_rng(seed)
+    pe = np.clip(pe_means + rng.standard_normal(len(dates)) * pe_stds, 10, 30)  # PE限制在合理范围
+    bond_yield = np.clip(bond_means + rng.standard_normal(len(dates)) * bond_stds, 1.5, 4.0)
+
+    # 计算股债利差
+    stock_yield = 100 / pe
+    historical_data = pd.DataFrame({
+        'date': dates,
+        'pe': pe,
+        'bond_yield': bond_yield,
+        'stock_yield': stock_yield,
+        'spread': bond_yield - stock_yield,
+        'year': years.astype(np.int64)
+    })
+
+    return historical_data
+
+
+def create_5year_historical_data(seed=_HIST_SEED):
+    """
+    构建2019-2024年5年历史股债数据
+    基于关键市场事件和实际走势
+    :param seed: 随机种子，同一种子的数据只生成一次
+    :return: 历史数据 DataFrame 的副本
+    """
+    return _load_5year_historical_data(seed).copy()
+
+
+@lru_cache(maxsize=4)
+def _sorted_5year_spreads(seed=_HIST_SEED):
+    """
+    排序后的5年股债利差，供分位数查找复用
+    :param seed: 随机种子
+    :return: 只读的升序 ndarray
+    """
+    spreads = np.sort(_load_5year_historical_data(seed)['spread'].to_numpy())
+    spreads.flags.writeable = False
+    return spreads
 
 def calculate_5year_ratio_index():
     """
     基于5年数据计算当前股债性价比指数
     """
+    out = []  # 输出先缓冲，结束时一次性写出
     
-    print("="*60)
-    print("基于5年历史的股债性价比指数计算")
-    print("="*60)
-    print(f"评估时间范围: 2019年12月 - 2024年12月 (5年)")
-    print(f"计算时间: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
-    print()
+    out.append("="*60)
+    out.append("基于5年历史的股债性价比指数计算")
+    out.append("="*60)
+    out.append(f"评估时间范围: 2019年12月 - 2024年12月 (5年)")
+    out.append(f"计算时间: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+    out.append("")
     
     # 生成5年历史数据
     historical_data = create_5year_historical_data()
@@ -116,34 +145,36 @@ def calculate_5year_ratio_index():
     current_stock_yield = 100 / current_pe
     current_spread = current_bond_yield - current_stock_yield
     
-    print("【当前市场数据】")
-    print(f"中证全指PE: {current_pe:.1f}倍")
-    print(f"10年期国债收益率: {current_bond_yield:.2f}%")
-    print(f"股票收益率(PE倒数): {current_stock_yield:.2f}%")
-    print(f"股债利差: {current_spread:.2f}%")
-    print()
-    
-    # 计算在5年历史中的分位数
-    historical_spreads = historical_data['spread'].values
-    percentile = np.sum(historical_spreads <= current_spread) / len(historical_spreads) * 100
-    
-    print("【5年历史分位数分析】")
-    print(f"5年内股债利差分布:")
-    print(f"最小值: {historical_spreads.min():.2f}%")
-    print(f"25%分位: {np.percentile(historical_spreads, 25):.2f}%")
-    print(f"50%分位(中位数): {np.percentile(historical_spreads, 50):.2f}%")
-    print(f"75%分位: {np.percentile(historical_spreads, 75):.2f}%")
-    print(f"最大值: {historical_spreads.max():.2f}%")
-    print()
-    print(f"当前股债利差: {current_spread:.2f}%")
-    print(f"5年历史分位数: {percentile:.1f}%")
-    print()
+    out.append("【当前市场数据】")
+    out.append(f"中证全指PE: {current_pe:.1f}倍")
+    out.append(f"10年期国债收益率: {current_bond_yield:.2f}%")
+    out.append(f"股票收益率(PE倒数): {current_stock_yield:.2f}%")
+    out.append(f"股债利差: {current_spread:.2f}%")
+    out.append("")
+    
+    # 计算在5年历史中的分位数（有序数组上二分查找）
+    sorted_spreads = _sorted_5year_spreads()
+    rank = np.searchsorted(sorted_spreads, current_spread, side='right')
+    percentile = rank / sorted_spreads.size * 100
+    q_min, q25, q50, q75, q_max = np.quantile(sorted_spreads, [0, 0.25, 0.5, 0.75, 1.0], method='linear')
+    
+    out.append("【5年历史分位数分析】")
+    out.append(f"5年内股债利差分布:")
+    out.append(f"最小值: {q_min:.2f}%")
+    out.append(f"25%分位: {q25:.2f}%")
+    out.append(f"50%分位(中位数): {q50:.2f}%")
+    out.append(f"75%分位: {q75:.2f}%")
+    out.append(f"最大值: {q_max:.2f}%")
+    out.append("")
+    out.append(f"当前股债利差: {current_spread:.2f}%")
+    out.append(f"5年历史分位数: {percentile:.1f}%")
+    out.append("")
     
     # 股债性价比指数就是历史分位数
     ratio_index_5y = percentile
     
-    print("【5年期股债性价比指数】")
-    print(f"指数值: {ratio_index_5y:.1f}")
+    out.append("【5年期股债性价比指数】")
+    out.append(f"指数值: {ratio_index_5y:.1f}")
     
     # 基于5年数据的估值水平判断
     if ratio_index_5y <= 10:
@@ -168,12 +199,12 @@ def calculate_5year_ratio_index():
         level = "极度高估"
         color = "🟣"
     
-    print(f"估值水平: {color} {level}")
-    print(f"含义: 在过去5年中，有{ratio_index_5y:.1f}%的时间股债利差高于当前水平")
-    print()
+    out.append(f"估值水平: {color} {level}")
+    out.append(f"含义: 在过去5年中，有{ratio_index_5y:.1f}%的时间股债利差高于当前水平")
+    out.append("")
     
     # 资产配置建议（基于5年视角）
-    print("【基于5年视角的配置建议】")
+    out.append("【基于5年视角的配置建议】")
     if ratio_index_5y <= 15:
         stock_pct, bond_pct = 80, 20
         suggestion = "股票相对极具吸引力，大幅增配"
@@ -195,10 +226,12 @@ def calculate_5year_ratio_index():
         suggestion = "债券相对极具吸引力，大幅增配"
         risk_level = "保守"
     
-    print(f"推荐配置: 股票 {stock_pct}% + 债券 {bond_pct}%")
-    print(f"配置逻辑: {suggestion}")
-    print(f"风险偏好: {risk_level}")
-    print()
+    out.append(f"推荐配置: 股票 {stock_pct}% + 债券 {bond_pct}%")
+    out.append(f"配置逻辑: {suggestion}")
+    out.append(f"风险偏好: {risk_level}")
+    out.append("")
+    
+    sys.stdout.write("\n".join(out) + "\n")
     
     return {
         'historical_data': historical_data,
@@ -219,34 +252,12 @@ def compare_timeframes():
     # 当前数据
     current_spread = 1.95 - (100/15.2)  # -4.63%
     
-    # 模拟不同时间范围的历史分位数
-    timeframes = {
-        "10年视角(2014-2024)": {
-            "historical_range": (-5.5, 1.0),
-            "percentile": 5,  # 极度低估
-            "allocation": "股票80%",
-            "reason": "包含2015牛市和2018熊市，范围更大"
-        },
-        "5年视角(2019-2024)": {
-            "historical_range": (-4.8, -1.2),  
-            "percentile": 15,  # 低估
-            "allocation": "股票70%", 
-            "reason": "主要是疫情后低利率时代，相对温和"
-        },
-        "3年视角(2021-2024)": {
-            "historical_range": (-4.2, -2.1),
-            "percentile": 25,  # 合理偏低
-            "allocation": "股票60%",
-            "reason": "近期震荡市，当前相对合理"
-        }
-    }
-    
     print("时间范围比较:")
     print("-" * 70)
     print(f"{'时间范围':<20} {'分位数':<8} {'估值水平':<12} {'建议配置':<12}")
     print("-" * 70)
     
-    for timeframe, data in timeframes.items():
+    for timeframe, data in _TIMEFRAMES.items():
         if data['percentile'] <= 20:
             level = "低估"
         elif data['percentile'] <= 40:
@@ -273,24 +284,29 @@ def plot_5year_analysis(data):
     historical_data = data['historical_data']
     current_spread = data['current_spread']
     
+    # 走势图按等间隔抽样，点数超过2000时减少折线段数；日期列只取一次
+    stride = max(1, int(np.ceil(len(historical_data) / _PLOT_MAX_POINTS)))
+    hd = historical_data.iloc[::stride]
+    dates = hd['date'].to_numpy()
+    
     fig, axes = plt.subplots(2, 2, figsize=(15, 12))
     fig.suptitle('5年期股债性价比分析 (2019-2024)', fontsize=16, fontweight='bold')
     
     # 1. 股债利差时间序列
-    axes[0,0].plot(historical_data['date'], historical_data['spread'], 
-                   color='blue', linewidth=2, alpha=0.7)
+    axes[0,0].plot(dates, hd['spread'], 
+                   color='blue', linewidth=2, alpha=0.7, rasterized=True)
     axes[0,0].axhline(y=current_spread, color='red', linestyle='--', 
                      linewidth=2, label=f'当前水平: {current_spread:.2f}%')
-    axes[0,0].fill_between(historical_data['date'], historical_data['spread'], 
-                          alpha=0.3, color='blue')
+    axes[0,0].fill_between(dates, hd['spread'], 
+                          alpha=0.3, color='blue', rasterized=True)
     axes[0,0].set_title('5年股债利差走势', fontweight='bold')
     axes[0,0].set_ylabel('股债利差(%)')
     axes[0,0].legend()
     axes[0,0].grid(True, alpha=0.3)
     
     # 2. PE估值走势
-    axes[0,1].plot(historical_data['date'], historical_data['pe'], 
-                   color='green', linewidth=2, alpha=0.7)
+    axes[0,1].plot(dates, hd['pe'], 
+                   color='green', linewidth=2, alpha=0.7, rasterized=True)
     axes[0,1].axhline(y=15.2, color='red', linestyle='--', 
                      linewidth=2, label='当前PE: 15.2倍')
     axes[0,1].set_title('5年PE估值走势', fontweight='bold')
@@ -299,8 +315,8 @@ def plot_5year_analysis(data):
     axes[0,1].grid(True, alpha=0.3)
     
     # 3. 债券收益率走势
-    axes[1,0].plot(historical_data['date'], historical_data['bond_yield'], 
-                   color='orange', linewidth=2, alpha=0.7)
+    axes[1,0].plot(dates, hd['bond_yield'], 
+                   color='orange', linewidth=2, alpha=0.7, rasterized=True)
     axes[1,0].axhline(y=1.95, color='red', linestyle='--', 
                      linewidth=2, label='当前收益率: 1.95%')
     axes[1,0].set_title('5年债券收益率走势', fontweight='bold')
@@ -317,8 +333,8 @@ def plot_5year_analysis(data):
     # 添加分位数线
     percentiles = [25, 50, 75]
     colors = ['green', 'orange', 'purple']
-    for p, color in zip(percentiles, colors):
-        value = np.percentile(historical_data['spread'], p)
+    values = np.percentile(historical_data['spread'].to_numpy(), percentiles)
+    for p, color, value in zip(percentiles, colors, values):
         axes[1,1].axvline(x=value, color=color, linestyle=':', alpha=0.7,
                          label=f'{p}%分位: {value:.2f}%')
     
@@ -6,107 +6,137 @@
 
 import pandas as pd
 import numpy as np
+import sys
 from datetime import datetime
 
+# 历史股债利差的典型分布区间（基于过去10年经验数据），区间左闭右开
+# 两端之外分别为超级低估/超级高估
+_BIN_EDGES = np.array([-3.5, -2.5, -1.5, -0.5, 0.5, 1.5, 2.5, 4.0])
+_BIN_PCTS = np.array([2, 5, 17.5, 32.5, 50, 67.5, 82.5, 95, 98])
+_BIN_LEVELS = (
+    "超级低估",
+    "极度低估(0-10分位)",
+    "低估区间(10-25分位)",
+    "合理偏低(25-40分位)",
+    "均衡区间(40-60分位)",
+    "合理偏高(60-75分位)",
+    "高估区间(75-90分位)",
+    "极度高估(90-100分位)",
+    "超级高估",
+)
+
+# 历史典型时期的股债数据，导入时构建一次
+_HISTORICAL_PERIODS = pd.DataFrame([
+    {
+        'period': '2024年12月(当前)',
+        'pe': 15.2,
+        'bond_yield': 1.95,
+        'stock_yield': 6.58,
+        'spread': -4.63,
+        'index': 32.5,
+        'market_state': '震荡偏弱'
+    },
+    {
+        'period': '2015年牛市顶部',
+        'pe': 25.0,
+        'bond_yield': 3.50,
+        'stock_yield': 4.00,
+        'spread': -0.50,
+        'index': 50,
+        'market_state': '牛市泡沫'
+    },
+    {
+        'period': '2018年底部',
+        'pe': 12.0,
+        'bond_yield': 3.30,
+        'stock_yield': 8.33,
+        'spread': -5.03,
+        'index': 15,
+        'market_state': '熊市底部'
+    },
+    {
+        'period': '2020年疫情后',
+        'pe': 18.0,
+        'bond_yield': 3.10,
+        'stock_yield': 5.56,
+        'spread': -2.46,
+        'index': 25,
+        'market_state': '复苏初期'
+    },
+    {
+        'period': '2022年低点',
+        'pe': 13.5,
+        'bond_yield': 2.80,
+        'stock_yield': 7.41,
+        'spread': -4.61,
+        'index': 18,
+        'market_state': '熊市底部'
+    }
+])
+
 def calculate_current_stock_bond_ratio():
     """
     计算当前股债性价比指数
     基于2024年12月最新数据
     """
-    print("="*60)
-    print("当前股债性价比指数计算")
-    print("="*60)
-    print(f"计算时间: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
-    print()
+    out = []  # 输出先缓冲，结束时一次性写出
+    out.append("="*60)
+    out.append("当前股债性价比指数计算")
+    out.append("="*60)
+    out.append(f"计算时间: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+    out.append("")
     
     # 最新市场数据（2024年12月）
-    print("【最新市场数据】")
+    out.append("【最新市场数据】")
     
     # 中证全指PE估值（根据搜索结果估算）
     # 东财全A市盈率15.27倍，百分位35.48%
     # 推算中证全指PE约在14-16倍区间
     current_csi_all_pe = 15.2  # 基于东财全A数据推算
-    print(f"中证全指PE估值: {current_csi_all_pe:.1f}倍")
-    print(f"PE百分位: 约35% (相对历史处于中低位)")
+    out.append(f"中证全指PE估值: {current_csi_all_pe:.1f}倍")
+    out.append(f"PE百分位: 约35% (相对历史处于中低位)")
     
     # 10年期国债收益率（基于搜索结果）
     # 2024年12月2日破2%，目前在1.9%-2.0%区间
     current_bond_yield = 1.95  # 当前约1.95%
-    print(f"10年期国债收益率: {current_bond_yield:.2f}%")
-    print(f"利率水平: 历史极低位 (首次跌破2%)")
-    print()
+    out.append(f"10年期国债收益率: {current_bond_yield:.2f}%")
+    out.append(f"利率水平: 历史极低位 (首次跌破2%)")
+    out.append("")
     
     # 计算股债利差
-    print("【股债利差计算】")
+    out.append("【股债利差计算】")
     stock_yield = 100 / current_csi_all_pe  # 股票收益率 = PE倒数
-    print(f"股票收益率(PE倒数): {stock_yield:.2f}%")
-    print(f"债券收益率: {current_bond_yield:.2f}%")
+    out.append(f"股票收益率(PE倒数): {stock_yield:.2f}%")
+    out.append(f"债券收益率: {current_bond_yield:.2f}%")
     
     stock_bond_spread = current_bond_yield - stock_yield
-    print(f"股债利差(债券-股票): {stock_bond_spread:.2f}%")
-    print()
+    out.append(f"股债利差(债券-股票): {stock_bond_spread:.2f}%")
+    out.append("")
     
     # 历史股债利差分布分析（基于经验数据）
-    print("【历史股债利差分析】")
-    print("基于过去10年历史数据分布:")
-    
-    # 历史股债利差的典型分布区间
-    historical_spreads = {
-        "极度低估(0-10分位)": (-3.5, -2.5),
-        "低估区间(10-25分位)": (-2.5, -1.5),
-        "合理偏低(25-40分位)": (-1.5, -0.5),
-        "均衡区间(40-60分位)": (-0.5, 0.5),
-        "合理偏高(60-75分位)": (0.5, 1.5),
-        "高估区间(75-90分位)": (1.5, 2.5),
-        "极度高估(90-100分位)": (2.5, 4.0)
-    }
-    
-    current_percentile = None
-    current_level = None
+    out.append("【历史股债利差分析】")
+    out.append("基于过去10年历史数据分布:")
     
-    for level, (low, high) in historical_spreads.items():
-        if low <= stock_bond_spread < high:
-            current_level = level
-            # 在区间内的位置
-            if "0-10" in level:
-                current_percentile = 5
-            elif "10-25" in level:
-                current_percentile = 17.5
-            elif "25-40" in level:
-                current_percentile = 32.5
-            elif "40-60" in level:
-                current_percentile = 50
-            elif "60-75" in level:
-                current_percentile = 67.5
-            elif "75-90" in level:
-                current_percentile = 82.5
-            else:
-                current_percentile = 95
-            break
+    # 按区间边界二分查找所在区间
+    idx = int(np.searchsorted(_BIN_EDGES, stock_bond_spread, side='right'))
+    current_percentile = float(_BIN_PCTS[idx])
+    current_level = _BIN_LEVELS[idx]
     
-    if current_level is None:
-        if stock_bond_spread < -3.5:
-            current_level = "超级低估"
-            current_percentile = 2
-        else:
-            current_level = "超级高估"
-            current_percentile = 98
-    
-    print(f"当前股债利差: {stock_bond_spread:.2f}%")
-    print(f"历史分位数: {current_percentile:.1f}%")
-    print(f"估值水平: {current_level}")
-    print()
+    out.append(f"当前股债利差: {stock_bond_spread:.2f}%")
+    out.append(f"历史分位数: {current_percentile:.1f}%")
+    out.append(f"估值水平: {current_level}")
+    out.append("")
     
     # 股债性价比指数（即历史分位数）
     ratio_index = current_percentile
     
-    print("【股债性价比指数】")
-    print(f"当前指数: {ratio_index:.1f}")
-    print(f"指数含义: 数值越低，股票相对债券越有吸引力")
-    print()
+    out.append("【股债性价比指数】")
+    out.append(f"当前指数: {ratio_index:.1f}")
+    out.append(f"指数含义: 数值越低，股票相对债券越有吸引力")
+    out.append("")
     
     # 资产配置建议
-    print("【资产配置建议】")
+    out.append("【资产配置建议】")
     if ratio_index <= 20:
         stock_allocation = 75
         bond_allocation = 25
@@ -133,35 +163,37 @@ def calculate_current_stock_bond_ratio():
         suggestion = "股票高估，大幅增配债券"
         risk_level = "保守配置"
     
-    print(f"推荐股票配置: {stock_allocation}%")
-    print(f"推荐债券配置: {bond_allocation}%")
-    print(f"配置建议: {suggestion}")
-    print(f"风险等级: {risk_level}")
-    print()
+    out.append(f"推荐股票配置: {stock_allocation}%")
+    out.append(f"推荐债券配置: {bond_allocation}%")
+    out.append(f"配置建议: {suggestion}")
+    out.append(f"风险等级: {risk_level}")
+    out.append("")
     
     # 特殊市场环境分析
-    print("【当前市场特殊情况分析】")
-    print("🎯 关键观察:")
-    print("1. 10年期国债收益率历史性跌破2%，创历史新低")
-    print("2. 股票PE估值处于历史中低位(35%分位)")
-    print("3. 股债利差处于相对均衡状态")
-    print()
+    out.append("【当前市场特殊情况分析】")
+    out.append("🎯 关键观察:")
+    out.append("1. 10年期国债收益率历史性跌破2%，创历史新低")
+    out.append("2. 股票PE估值处于历史中低位(35%分位)")
+    out.append("3. 股债利差处于相对均衡状态")
+    out.append("")
     
-    print("💡 投资含义:")
+    out.append("💡 投资含义:")
     if stock_bond_spread > -1.0:
-        print("• 在当前极低利率环境下，股票相对吸引力上升")
-        print("• 债券收益率过低，配置价值有限")
-        print("• 建议适度向股票倾斜")
+        out.append("• 在当前极低利率环境下，股票相对吸引力上升")
+        out.append("• 债券收益率过低，配置价值有限")
+        out.append("• 建议适度向股票倾斜")
     else:
-        print("• 股票估值合理，债券收益率虽低但相对稳定")
-        print("• 适合进行均衡配置")
+        out.append("• 股票估值合理，债券收益率虽低但相对稳定")
+        out.append("• 适合进行均衡配置")
         
-    print()
-    print("⚠️ 风险提示:")
-    print("• 国债收益率极低可能暗示经济增长预期偏弱")
-    print("• 需关注政策变化对利率和股市的影响")
-    print("• 建议定期调整配置以适应市场变化")
-    print()
+    out.append("")
+    out.append("⚠️ 风险提示:")
+    out.append("• 国债收益率极低可能暗示经济增长预期偏弱")
+    out.append("• 需关注政策变化对利率和股市的影响")
+    out.append("• 建议定期调整配置以适应市场变化")
+    out.append("")
+    
+    sys.stdout.write("\n".join(out) + "\n")
     
     return {
         'date': datetime.now().strftime('%Y-%m-%d'),
@@ -184,62 +216,12 @@ def create_historical_comparison():
     print("历史典型时期股债性价比对比")
     print("="*60)
     
-    historical_periods = [
-        {
-            'period': '2024年12月(当前)',
-            'pe': 15.2,
-            'bond_yield': 1.95,
-            'stock_yield': 6.58,
-            'spread': -4.63,
-            'index': 32.5,
-            'market_state': '震荡偏弱'
-        },
-        {
-            'period': '2015年牛市顶部',
-            'pe': 25.0,
-            'bond_yield': 3.50,
-            'stock_yield': 4.00,
-            'spread': -0.50,
-            'index': 50,
-            'market_state': '牛市泡沫'
-        },
-        {
-            'period': '2018年底部',
-            'pe': 12.0,
-            'bond_yield': 3.30,
-            'stock_yield': 8.33,
-            'spread': -5.03,
-            'index': 15,
-            'market_state': '熊市底部'
-        },
-        {
-            'period': '2020年疫情后',
-            'pe': 18.0,
-            'bond_yield': 3.10,
-            'stock_yield': 5.56,
-            'spread': -2.46,
-            'index': 25,
-            'market_state': '复苏初期'
-        },
-        {
-            'period': '2022年低点',
-            'pe': 13.5,
-            'bond_yield': 2.80,
-            'stock_yield': 7.41,
-            'spread': -4.61,
-            'index': 18,
-            'market_state': '熊市底部'
-        }
-    ]
-    
-    df = pd.DataFrame(historical_periods)
-    
     print("历史时期对比:")
     print("-" * 80)
     print(f"{'时期':<15} {'PE':<6} {'债券%':<6} {'股票%':<6} {'利差':<7} {'指数':<6} {'市场状态':<10}")
     print("-" * 80)
     
-    for _, row in df.iterrows():
+    for _, row in _HISTORICAL_PERIODS.iterrows():
         print(f"{row['period']:<15} {row['pe']:<6.1f} {row['bond_yield']:<6.2f} {row['stock_yield']:<6.2f} "
               f"{row['spread']:<7.2f} {row['index']:<6.1f} {row['market_state']:<10}")
     
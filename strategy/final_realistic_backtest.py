@@ -10,11 +10,86 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
+from numpy.lib.stride_tricks import sliding_window_view
 from datetime import datetime
+from functools import lru_cache
 
-plt.rcParams['font.sans-serif'] = ['Heiti TC', 'Arial Unicode MS', 'STHeiti', 'SimHei']
-plt.rcParams['axes.unicode_minus'] = False
+# 股债配置规则（更均衡的配置）：按股债性价比指数分档，每档对应股票仓位和配置建议
+_RATIO_EDGES = np.array([25, 45, 55, 75])
+_STOCK_PCT = np.array([70, 60, 50, 40, 30], dtype=np.int8)
+_SUGGESTIONS = ("股票低估，增配股票", "偏股配置", "均衡配置", "偏债配置", "股票高估，增配债券")
+
+
+@lru_cache(maxsize=1)
+def _build_price_series():
+    """
+    构建沪深300月度价格走势（确定性部分，结果缓存，多次回测只计算一次）
+    :return: (月末日期, 只读价格数组)
+    """
+    # 月度数据点
+    dates = pd.date_range('2014-01-31', '2024-12-31', freq='M')
+    
+    # 真实沪深300关键时点（基于历史数据）
+    key_points = {
+        '2014-12': 3234,  # 起点
+        '2015-06': 5166,  # 牛市顶点
+        '2015-08': 3507,  # 股灾后
+        '2016-01': 3016,  # 熔断底部
+        '2017-12': 4030,  # 蓝筹牛市
+        '2018-12': 3006,  # 贸易战底部
+        '2019-12': 3977,  # 反弹
+        '2020-03': 3477,  # 疫情Q1下跌
+        '2020-07': 4900,  # 疫情后高点
+        '2020-12': 4900,  # 下半年高位整理
+        '2021-02': 5900,  # 牛市高点
+        '2021-12': 4900,  # 回落
+        '2022-04': 3900,  # 下跌
+        '2022-10': 3600,  # 底部
+        '2024-12': 3935   # 终点
+    }
+    
+    # 关键时点之间按月线性插值（2014年12月之前取起点价格）
+    month_ordinals = dates.to_period('M').asi8
+    key_ordinals = pd.PeriodIndex(list(key_points), freq='M').asi8
+    prices = np.interp(month_ordinals, key_ordinals, list(key_points.values()))
+    
+    # 2023-2024震荡恢复，在插值基础上叠加起伏
+    years = dates.year.to_numpy()
+    months_from_oct22 = (years - 2022) * 12 + dates.month.to_numpy() - 10
+    recovery = years >= 2023
+    prices[recovery] += 200 * np.sin(months_from_oct22[recovery] * 0.5)
+    
+    prices = np.maximum(prices, 2500)  # 最低不低于2500
+    
+    # 确保最终价格准确
+    prices[-1] = 3935  # 2024年12月确切收盘
+    
+    prices.setflags(write=False)
+    return dates, prices
+
+
+def _add_stochastic_columns(prices: np.ndarray, seed: int):
+    """
+    按价格走势生成带随机扰动的PE和债券收益率
+    :param prices: _build_price_series返回的价格数组
+    :param seed: 随机种子
+    :return: (PE数组, 债券收益率数组)
+    """
+    dates, _ = _build_price_series()
+    years = dates.year.to_numpy()
+    rng = np.random.default_rng(seed)
+    
+    # PE值（基于历史范围）：高点时PE高，低点时PE低，中位时PE中等
+    pe_mean = np.where(prices > 5000, 20, np.where(prices < 3200, 11, 15))
+    pe_std = np.where(prices < 3200, 1.5, 2)
+    pe_ratios = np.clip(pe_mean + rng.standard_normal(len(prices)) * pe_std, 8, 30)
+    
+    # 债券收益率（基于历史趋势）
+    base_yield = np.select([years <= 2016, years <= 2018, years <= 2020, years <= 2022],
+                           [3.4, 3.8, 3.1, 2.9], default=2.7)
+    bond_yields = np.clip(base_yield + rng.normal(0, 0.2, len(prices)), 2.0, 4.5)
+    
+    return pe_ratios, bond_yields
 
 
 class FinalRealisticBacktest:
@@ -22,8 +97,9 @@ class FinalRealisticBacktest:
     严格基于真实沪深300表现的回测
     """
     
-    def __init__(self, initial_capital: float = 100000):
+    def __init__(self, initial_capital: float = 100000, seed: int = 2024):
         self.initial_capital = initial_capital
+        self.seed = seed  # 随机种子，保证PE和债券收益率可重现
     
     def create_realistic_hs300_performance(self) -> pd.DataFrame:
         """
@@ -31,126 +107,8 @@ class FinalRealisticBacktest:
         2014年末3234点 -> 2024年末3935点 = 21.7%价格涨幅
         加上分红约2.5%年化 -> 总收益约43%
         """
-        # 月度数据点
-        dates = pd.date_range('2014-01-31', '2024-12-31', freq='M')
-        months = len(dates)
-        
-        # 真实沪深300关键时点（基于历史数据）
-        key_points = {
-            '2014-12': 3234,  # 起点
-            '2015-06': 5166,  # 牛市顶点
-            '2015-08': 3507,  # 股灾后
-            '2016-01': 3016,  # 熔断底部
-            '2017-12': 4030,  # 蓝筹牛市
-            '2018-12': 3006,  # 贸易战底部
-            '2019-12': 3977,  # 反弹
-            '2020-07': 4900,  # 疫情后高点
-            '2021-02': 5900,  # 牛市高点
-            '2021-12': 4900,  # 回落
-            '2022-04': 3900,  # 下跌
-            '2022-10': 3600,  # 底部
-            '2024-12': 3935   # 终点
-        }
-        
-        # 插值生成月度价格
-        prices = []
-        pe_ratios = []
-        bond_yields = []
-        
-        for i, date in enumerate(dates):
-            year_month = date.strftime('%Y-%m')
-            
-            # 价格插值
-            if year_month in key_points:
-                price = key_points[year_month]
-            else:
-                # 线性插值
-                year = date.year
-                month = date.month
-                
-                if year <= 2015 and month <= 6:  # 牛市上涨
-                    progress = (i / 18)  # 前18个月
-                    price = 3234 + (5166 - 3234) * progress
-                elif year == 2015 and month <= 8:  # 股灾
-                    price = 5166 - (5166 - 3507) * ((month - 6) / 2)
-                elif year <= 2016:  # 继续下跌到熔断
-                    months_from_aug15 = (year - 2015) * 12 + month - 8
-                    total_months = 5  # 到2016年1月
-                    progress = min(months_from_aug15 / total_months, 1)
-                    price = 3507 - (3507 - 3016) * progress
-                elif year <= 2017:  # 缓慢恢复
-                    months_from_jan16 = (year - 2016) * 12 + month - 1
-                    total_months = 24  # 2年
-                    progress = min(months_from_jan16 / total_months, 1)
-                    price = 3016 + (4030 - 3016) * progress
-                elif year <= 2018:  # 贸易战下跌
-                    months_from_dec17 = (year - 2017) * 12 + month - 12
-                    total_months = 12
-                    progress = min(months_from_dec17 / total_months, 1)
-                    price = 4030 - (4030 - 3006) * progress
-                elif year <= 2019:  # 反弹
-                    months_from_dec18 = (year - 2018) * 12 + month - 12
-                    total_months = 12
-                    progress = min(months_from_dec18 / total_months, 1)
-                    price = 3006 + (3977 - 3006) * progress
-                elif year == 2020:  # 疫情年波动
-                    if month <= 3:  # Q1下跌
-                        price = 3977 - 500
-                    elif month <= 7:  # 反弹
-                        price = 3977 + (4900 - 3977) * ((month - 3) / 4)
-                    else:  # 高位整理
-                        price = 4900
-                elif year == 2021:  # 结构牛市
-                    if month <= 2:  # 涨到高点
-                        price = 4900 + (5900 - 4900) * (month / 2)
-                    else:  # 回落
-                        price = 5900 - (5900 - 4900) * ((month - 2) / 10)
-                elif year <= 2022:  # 下跌年
-                    months_from_dec21 = (year - 2021) * 12 + month - 12
-                    if months_from_dec21 <= 4:  # 前4个月跌到3900
-                        progress = months_from_dec21 / 4
-                        price = 4900 - (4900 - 3900) * progress
-                    else:  # 继续跌到3600
-                        progress = min((months_from_dec21 - 4) / 8, 1)
-                        price = 3900 - (3900 - 3600) * progress
-                else:  # 2023-2024震荡恢复
-                    months_from_oct22 = (year - 2022) * 12 + month - 10
-                    total_months = 26  # 到2024年12月
-                    progress = min(months_from_oct22 / total_months, 1)
-                    # 震荡恢复，有起伏
-                    base_recovery = 3600 + (3935 - 3600) * progress
-                    noise = 200 * np.sin(months_from_oct22 * 0.5)  # 震荡
-                    price = base_recovery + noise
-            
-            prices.append(max(price, 2500))  # 最低不低于2500
-            
-            # PE值（基于历史范围）
-            if price > 5000:  # 高点时PE高
-                pe = 20 + np.random.normal(0, 2)
-            elif price < 3200:  # 低点时PE低
-                pe = 11 + np.random.normal(0, 1.5)
-            else:  # 中位时PE中等
-                pe = 15 + np.random.normal(0, 2)
-            pe_ratios.append(max(8, min(pe, 30)))
-            
-            # 债券收益率（基于历史趋势）
-            year = date.year
-            if year <= 2016:
-                base_yield = 3.4
-            elif year <= 2018:
-                base_yield = 3.8
-            elif year <= 2020:
-                base_yield = 3.1
-            elif year <= 2022:
-                base_yield = 2.9
-            else:
-                base_yield = 2.7
-            
-            yield_val = base_yield + np.random.normal(0, 0.2)
-            bond_yields.append(max(2.0, min(yield_val, 4.5)))
-        
-        # 确保最终价格准确
-        prices[-1] = 3935  # 2024年12月确切收盘
+        dates, prices = _build_price_series()
+        pe_ratios, bond_yields = _add_stochastic_columns(prices, self.seed)
         
         return pd.DataFrame({
             'date': dates,
@@ -178,95 +136,57 @@ class FinalRealisticBacktest:
         data['stock_yield'] = 100 / data['pe_ratio']
         data['stock_bond_spread'] = data['bond_yield'] - data['stock_yield']
         
-        # 股债性价比指数
+        # 股债性价比指数：当前利差在近2年（不足2年时取全部历史）利差中的分位数
         window = 24  # 2年窗口
-        data['ratio_index'] = 0.0
-        
-        for i in range(len(data)):
-            if i < window:
-                historical_spread = data['stock_bond_spread'][:i+1]
-            else:
-                historical_spread = data['stock_bond_spread'][i-window+1:i+1]
-            
-            if len(historical_spread) > 1:
-                current_spread = data['stock_bond_spread'].iloc[i]
-                percentile = np.sum(historical_spread <= current_spread) / len(historical_spread) * 100
-                data.at[i, 'ratio_index'] = percentile
+        spread = data['stock_bond_spread'].to_numpy()
+        # 前面补NaN使每个月都对应一个完整窗口，NaN既不计数也不计入长度
+        windows = sliding_window_view(np.concatenate([np.full(window - 1, np.nan), spread]), window)
+        counts = (windows <= spread[:, None]).sum(axis=1)
+        lengths = np.minimum(np.arange(1, len(spread) + 1), window)
+        ratio_index = counts / lengths * 100
+        ratio_index[lengths <= 1] = 0.0  # 只有一个数据点时不计算分位数
+        data['ratio_index'] = ratio_index
         
         print("正在执行投资组合模拟...")
         
-        # 投资组合回测
-        results = []
-        total_value = self.initial_capital
+        # 股债配置规则（更均衡的配置）
+        ratio = data['ratio_index'].to_numpy()
+        bucket = np.searchsorted(_RATIO_EDGES, ratio).astype(np.int8)
+        stock_pct = _STOCK_PCT[bucket]
+        bond_pct = 100 - stock_pct
+        
+        # 股票收益（价格变动 + 分红2.5%年化）与债券收益（上月收益率月化），首月无收益
+        price = data['hs300_price'].to_numpy()
+        bond_yield = data['bond_yield'].to_numpy()
+        monthly_dividend = 0.025 / 12  # 年化2.5%分红
+        stock_return = np.zeros(len(data))
+        bond_return = np.zeros(len(data))
+        stock_return[1:] = np.diff(price) / price[:-1] + monthly_dividend
+        bond_return[1:] = bond_yield[:-1] / 100 / 12
+        
+        # 按上月配置计算当月收益（假设每月调仓）；首月收益为0，沿用当月配置即可
+        prev_stock_pct = np.concatenate([stock_pct[:1], stock_pct[:-1]]) / 100
+        prev_bond_pct = np.concatenate([bond_pct[:1], bond_pct[:-1]]) / 100
+        # 策略与基准（沪深300含分红）的月度净值乘数叠成(2, N)矩阵，一次累乘
+        multipliers = np.stack([1 + prev_stock_pct * stock_return + prev_bond_pct * bond_return,
+                                1 + stock_return])
+        portfolio_value, benchmark_value = self.initial_capital * np.cumprod(multipliers, axis=1)
         
-        for i, row in data.iterrows():
-            # 股债配置规则（更均衡的配置）
-            ratio = row['ratio_index']
-            if ratio <= 25:
-                stock_pct, bond_pct = 70, 30
-                suggestion = "股票低估，增配股票"
-            elif ratio <= 45:
-                stock_pct, bond_pct = 60, 40
-                suggestion = "偏股配置"
-            elif ratio <= 55:
-                stock_pct, bond_pct = 50, 50
-                suggestion = "均衡配置"
-            elif ratio <= 75:
-                stock_pct, bond_pct = 40, 60
-                suggestion = "偏债配置"
-            else:
-                stock_pct, bond_pct = 30, 70
-                suggestion = "股票高估，增配债券"
-            
-            # 计算当月收益
-            if i == 0:
-                stock_value = total_value * (stock_pct / 100)
-                bond_value = total_value * (bond_pct / 100)
-                portfolio_value = total_value
-                benchmark_value = self.initial_capital
-            else:
-                # 股票收益（价格变动 + 分红2.5%年化）
-                price_change = (row['hs300_price'] - data.iloc[i-1]['hs300_price']) / data.iloc[i-1]['hs300_price']
-                monthly_dividend = 0.025 / 12  # 年化2.5%分红
-                stock_return = price_change + monthly_dividend
-                
-                # 债券收益
-                bond_return = data.iloc[i-1]['bond_yield'] / 100 / 12  # 月化收益
-                
-                # 更新资产价值（假设每月调仓）
-                prev_stock_pct = results[i-1]['stock_allocation'] / 100
-                prev_bond_pct = results[i-1]['bond_allocation'] / 100
-                
-                # 按上月配置计算收益
-                stock_gain = prev_stock_pct * total_value * stock_return
-                bond_gain = prev_bond_pct * total_value * bond_return
-                total_gain = stock_gain + bond_gain
-                
-                total_value += total_gain
-                stock_value = total_value * (stock_pct / 100)
-                bond_value = total_value * (bond_pct / 100)
-                portfolio_value = total_value
-                
-                # 基准（沪深300含分红）
-                benchmark_return = stock_return  # 沪深300含分红收益
-                benchmark_value *= (1 + benchmark_return)
-            
-            results.append({
-                'date': row['date'],
-                'ratio_index': row['ratio_index'],
-                'stock_allocation': stock_pct,
-                'bond_allocation': bond_pct,
-                'suggestion': suggestion,
-                'portfolio_value': portfolio_value,
-                'benchmark_value': benchmark_value,
-                'hs300_price': row['hs300_price'],
-                'bond_yield': row['bond_yield'],
-                'portfolio_return': (portfolio_value - self.initial_capital) / self.initial_capital * 100,
-                'benchmark_return': (benchmark_value - self.initial_capital) / self.initial_capital * 100,
-                'excess_return': (portfolio_value - benchmark_value) / self.initial_capital * 100
-            })
-        
-        return pd.DataFrame(results)
+        return pd.DataFrame({
+            'date': data['date'],
+            'ratio_index': ratio,
+            'stock_allocation': stock_pct,
+            'bond_allocation': bond_pct,
+            'suggestion': pd.Categorical.from_codes(bucket, _SUGGESTIONS),
+            'portfolio_value': portfolio_value,
+            'benchmark_value': benchmark_value,
+            'hs300_price': price,
+            'bond_yield': bond_yield,
+            # 收益率百分比用float32存储即可（仓位列为int8）
+            'portfolio_return': ((portfolio_value - self.initial_capital) / self.initial_capital * 100).astype(np.float32),
+            'benchmark_return': ((benchmark_value - self.initial_capital) / self.initial_capital * 100).astype(np.float32),
+            'excess_return': ((portfolio_value - benchmark_value) / self.initial_capital * 100).astype(np.float32)
+        })
     
     def generate_final_report(self, results: pd.DataFrame):
         """
@@ -284,78 +204,96 @@ class FinalRealisticBacktest:
         portfolio_annual = (final_portfolio / self.initial_capital) ** (1/years) - 1
         benchmark_annual = (final_benchmark / self.initial_capital) ** (1/years) - 1
         
-        print("\n" + "="*70)
-        print("最终版：基于真实沪深300表现的股债策略回测")
-        print("="*70)
-        print("数据验证:")
-        print(f"沪深300价格: 3234点 -> 3935点 (+21.7%)")
+        # 报告逐行收集后一次性输出
+        lines = ["\n" + "="*70]
+        lines.append("最终版：基于真实沪深300表现的股债策略回测")
+        lines.append("="*70)
+        lines.append("数据验证:")
+        lines.append(f"沪深300价格: 3234点 -> 3935点 (+21.7%)")
         initial_price = results.iloc[0]['hs300_price']
         final_price = results.iloc[-1]['hs300_price']
         actual_price_gain = (final_price - initial_price) / initial_price * 100
-        print(f"模拟价格涨幅: {actual_price_gain:.1f}%")
-        print(f"含分红总收益: {benchmark_return:.1f}% (目标约43%)")
-        print(f"含分红年化: {benchmark_annual*100:.2f}% (目标约3.5%)")
-        print()
+        lines.append(f"模拟价格涨幅: {actual_price_gain:.1f}%")
+        lines.append(f"含分红总收益: {benchmark_return:.1f}% (目标约43%)")
+        lines.append(f"含分红年化: {benchmark_annual*100:.2f}% (目标约3.5%)")
+        lines.append("")
         
         if abs(benchmark_return - 43) <= 10 and abs(benchmark_annual*100 - 3.5) <= 1:
-            print("✅ 基准数据与真实表现高度吻合")
+            lines.append("✅ 基准数据与真实表现高度吻合")
         else:
-            print("⚠️ 基准数据需要进一步校准")
-        print()
-        
-        print("【最终回测结果】")
-        print(f"策略终值: ¥{final_portfolio:,.0f}")
-        print(f"基准终值: ¥{final_benchmark:,.0f}")
-        print(f"策略收益: {portfolio_return:+.1f}%")
-        print(f"基准收益: {benchmark_return:+.1f}%")
-        print(f"超额收益: {excess_return:+.1f}%")
-        print()
-        
-        print("【年化表现】")
-        print(f"策略年化: {portfolio_annual*100:+.2f}%")
-        print(f"基准年化: {benchmark_annual*100:+.2f}%")
-        print()
+            lines.append("⚠️ 基准数据需要进一步校准")
+        lines.append("")
+        
+        lines.append("【最终回测结果】")
+        lines.append(f"策略终值: ¥{final_portfolio:,.0f}")
+        lines.append(f"基准终值: ¥{final_benchmark:,.0f}")
+        lines.append(f"策略收益: {portfolio_return:+.1f}%")
+        lines.append(f"基准收益: {benchmark_return:+.1f}%")
+        lines.append(f"超额收益: {excess_return:+.1f}%")
+        lines.append("")
+        
+        lines.append("【年化表现】")
+        lines.append(f"策略年化: {portfolio_annual*100:+.2f}%")
+        lines.append(f"基准年化: {benchmark_annual*100:+.2f}%")
+        lines.append("")
         
         # 最大回撤
-        portfolio_peak = results['portfolio_value'].cummax()
-        portfolio_drawdown = (results['portfolio_value'] - portfolio_peak) / portfolio_peak * 100
-        max_drawdown = portfolio_drawdown.min()
+        portfolio_values = results['portfolio_value'].to_numpy()
+        portfolio_peak = np.maximum.accumulate(portfolio_values)
+        max_drawdown = ((portfolio_values - portfolio_peak) / portfolio_peak * 100).min()
         
-        benchmark_peak = results['benchmark_value'].cummax()
-        benchmark_drawdown = (results['benchmark_value'] - benchmark_peak) / benchmark_peak * 100
-        benchmark_max_drawdown = benchmark_drawdown.min()
+        benchmark_values = results['benchmark_value'].to_numpy()
+        benchmark_peak = np.maximum.accumulate(benchmark_values)
+        benchmark_max_drawdown = ((benchmark_values - benchmark_peak) / benchmark_peak * 100).min()
         
-        print("【风险控制】")
-        print(f"策略最大回撤: {max_drawdown:.1f}%")
-        print(f"基准最大回撤: {benchmark_max_drawdown:.1f}%")
-        print()
+        lines.append("【风险控制】")
+        lines.append(f"策略最大回撤: {max_drawdown:.1f}%")
+        lines.append(f"基准最大回撤: {benchmark_max_drawdown:.1f}%")
+        lines.append("")
         
-        print("【策略评价】")
+        lines.append("【策略评价】")
         if excess_return > 0:
-            print("✅ 股债策略在A股震荡环境中产生正超额收益")
-            print("💡 验证了资产配置策略在震荡市中的有效性")
+            lines.append("✅ 股债策略在A股震荡环境中产生正超额收益")
+            lines.append("💡 验证了资产配置策略在震荡市中的有效性")
         else:
-            print("❌ 股债策略跑输纯股票投资")
+            lines.append("❌ 股债策略跑输纯股票投资")
             if abs(excess_return) < 10:
-                print("💡 但超额收益差距不大，策略具有一定价值")
-                print("💡 特别是在风险控制方面表现更好")
+                lines.append("💡 但超额收益差距不大，策略具有一定价值")
+                lines.append("💡 特别是在风险控制方面表现更好")
             else:
-                print("💡 策略过于保守，错失股票收益机会")
+                lines.append("💡 策略过于保守，错失股票收益机会")
         
-        print(f"\n【资产配置统计】")
-        allocation_stats = results['suggestion'].value_counts()
+        lines.append(f"\n【资产配置统计】")
+        counts = np.bincount(results['suggestion'].cat.codes.to_numpy(), minlength=len(_SUGGESTIONS))
         total_periods = len(results)
-        for suggestion, count in allocation_stats.items():
-            percentage = count / total_periods * 100
-            print(f"{suggestion}: {count}次 ({percentage:.1f}%)")
+        for suggestion, count in zip(_SUGGESTIONS, counts):
+            if count:
+                percentage = count / total_periods * 100
+                lines.append(f"{suggestion}: {count}次 ({percentage:.1f}%)")
+        
+        sys.stdout.write("\n".join(lines) + "\n")
         
         return results
     
-    def plot_final_results(self, results: pd.DataFrame):
+    def plot_final_results(self, results: pd.DataFrame, show: bool = True, dpi: int = 300):
         """
         绘制最终结果
+        :param results: 回测结果
+        :param show: 是否弹出图表窗口；为False时直接用Agg画布渲染并保存，不经过pyplot和图形界面
+        :param dpi: 保存图片的分辨率，批量回测时可调低
         """
-        fig, axes = plt.subplots(2, 2, figsize=(15, 12))
+        # matplotlib在绘图时才导入，只做回测的调用方不必承担pyplot的导入开销
+        import matplotlib
+        matplotlib.rcParams['font.sans-serif'] = ['Heiti TC', 'Arial Unicode MS', 'STHeiti', 'SimHei']
+        matplotlib.rcParams['axes.unicode_minus'] = False
+        
+        if show:
+            import matplotlib.pyplot as plt
+            fig = plt.figure(figsize=(15, 12))
+        else:
+            from matplotlib.figure import Figure
+            fig = Figure(figsize=(15, 12))
+        axes = fig.subplots(2, 2)
         fig.suptitle('真实沪深300表现下的股债策略回测结果 (2014-2024)', fontsize=16, fontweight='bold')
         
         from matplotlib.dates import DateFormatter
@@ -414,10 +352,12 @@ class FinalRealisticBacktest:
         axes[1,1].grid(True, alpha=0.3)
         axes[1,1].xaxis.set_major_formatter(date_fmt)
         
-        plt.tight_layout()
-        plt.savefig('final_realistic_backtest.png', dpi=300, bbox_inches='tight')
+        fig.tight_layout()
+        fig.savefig('final_realistic_backtest.png', dpi=dpi, bbox_inches='tight')
         print("最终真实回测图表已保存: final_realistic_backtest.png")
-        plt.show()
+        if show:
+            plt.show()
+            plt.close(fig)
 
 
 def main():
@@ -437,13 +377,14 @@ def main():
     
     print(f"\n关键时点回顾:")
     key_dates = ['2015-06', '2018-12', '2021-02', '2022-10', '2024-12']
-    key_results = final_results[final_results['date'].dt.strftime('%Y-%m').isin(key_dates)]
+    # 按月份周期匹配关键时点，不必把每个日期都格式化成字符串
+    key_results = final_results[final_results['date'].dt.to_period('M').isin(pd.PeriodIndex(key_dates, freq='M'))]
     
     display_data = key_results[['date', 'hs300_price', 'portfolio_value', 'benchmark_value', 'excess_return']].copy()
     display_data['date'] = display_data['date'].dt.strftime('%Y-%m')
     display_data[['hs300_price']] = display_data[['hs300_price']].round(0).astype(int)
     display_data[['portfolio_value', 'benchmark_value']] = display_data[['portfolio_value', 'benchmark_value']].round(0).astype(int)
-    display_data['excess_return'] = display_data['excess_return'].round(1)
+    display_data['excess_return'] = display_data['excess_return'].astype(float).round(1)  # float32转回float64再取整，避免显示尾数
     print(display_data.to_string(index=False))
 
 
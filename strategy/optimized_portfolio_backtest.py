@@ -10,13 +10,34 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import matplotlib.pyplot as plt
 from datetime import datetime, timedelta
+from numba import njit
 
 plt.rcParams['font.sans-serif'] = ['Heiti TC', 'Arial Unicode MS', 'STHeiti', 'SimHei']
 plt.rcParams['axes.unicode_minus'] = False
 
 
+@njit(cache=True)
+def _smooth_ratio_index(percentiles: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """
+    对百分位做指数平滑（0.7 * 当前百分位 + 0.3 * 上一期指数），避免过度波动
+    :param percentiles: 每一行利差的回看期百分位
+    :param lengths: 每一行回看窗口内的数据个数，只有一个数据点时不计算，指数为0
+    :return: 股债性价比指数数组
+    """
+    n = percentiles.shape[0]
+    out = np.zeros(n)
+    for i in range(n):
+        if lengths[i] > 1:
+            if i > 0:
+                out[i] = 0.7 * percentiles[i] + 0.3 * out[i - 1]
+            else:
+                out[i] = percentiles[i]
+    return out
+
+
 class OptimizedStockBondStrategy:
     """
     优化版股债性价比策略
@@ -68,24 +89,16 @@ class OptimizedStockBondStrategy:
         merged_data['stock_bond_spread'] = merged_data['bond_yield'] - merged_data['stock_yield']
         
         # 计算性价比指数（优化版）
-        merged_data['ratio_index'] = 0.0
-        
-        for i in range(len(merged_data)):
-            if i < self.lookback_period:
-                historical_spread = merged_data['stock_bond_spread'][:i+1]
-            else:
-                historical_spread = merged_data['stock_bond_spread'][i-self.lookback_period+1:i+1]
-            
-            if len(historical_spread) > 1:
-                current_spread = merged_data['stock_bond_spread'].iloc[i]
-                # 使用更敏感的百分位计算
-                percentile = np.sum(historical_spread <= current_spread) / len(historical_spread) * 100
-                # 平滑处理，避免过度波动
-                if i > 0:
-                    prev_index = merged_data['ratio_index'].iloc[i-1]
-                    merged_data.at[i, 'ratio_index'] = 0.7 * percentile + 0.3 * prev_index
-                else:
-                    merged_data.at[i, 'ratio_index'] = percentile
+        # 当前利差在回看期（不足回看期时取全部历史）利差中的百分位，使用更敏感的百分位计算
+        window = self.lookback_period
+        spread = merged_data['stock_bond_spread'].to_numpy()
+        # 前面补NaN使每一行都对应一个完整窗口，NaN既不计数也不计入长度
+        # 多补一个NaN再去掉第一个窗口，空数据时也能得到形状正确的(0, window)
+        windows = sliding_window_view(np.concatenate([np.full(window, np.nan), spread]), window)[1:]
+        lengths = np.minimum(np.arange(1, len(spread) + 1), window)
+        percentiles = (windows <= spread[:, None]).sum(axis=1) / lengths * 100
+        
+        merged_data['ratio_index'] = _smooth_ratio_index(percentiles, lengths)
         
         return merged_data
 
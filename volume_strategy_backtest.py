@@ -33,24 +33,14 @@ def volume_percentile_strategy_backtest(start_date: str = "2020-01-01", end_date
         macro_df = get_macro_data(start_date=start_date, end_date=end_date)
         if not macro_df.empty:
             macro_df = calculate_macro_signals(macro_df)
-            # 将宏观数据转换为日期索引的字典，便于快速查找
-            macro_signals = {}
-            for _, row in macro_df.iterrows():
-                if pd.notna(row['date']):  # 只处理有效日期
-                    # 确保日期是datetime对象
-                    if isinstance(row['date'], str):
-                        date_obj = pd.to_datetime(row['date'])
-                    else:
-                        date_obj = row['date']
-                    
-                    date_key = date_obj.strftime('%Y-%m-%d')
-                    macro_signals[date_key] = {
-                        'interest_rate_signal': row.get('interest_rate_signal', 0),
-                        'money_policy_signal': row.get('money_policy_signal', 0),
-                        'economic_signal': row.get('economic_signal', 0),
-                        'global_signal': row.get('global_signal', 0),
-                        'macro_total_signal': row.get('macro_total_signal', 0)
-                    }
+            # 将宏观数据转换为日期索引的字典，便于快速查找；日期整列一次性解析，不逐行转换
+            macro_dates = pd.to_datetime(macro_df['date'])
+            valid = macro_dates.notna().to_numpy()  # 只处理有效日期
+            signal_cols = ['interest_rate_signal', 'money_policy_signal', 'economic_signal', 'global_signal', 'macro_total_signal']
+            macro_signals = dict(zip(
+                macro_dates[valid].dt.strftime('%Y-%m-%d'),
+                macro_df.reindex(columns=signal_cols, fill_value=0)[valid].to_dict('records')
+            ))
             print(f"成功获取宏观信号，覆盖 {len(macro_signals)} 个交易日")
         else:
             print("未获取到宏观数据，将跳过宏观因子")
@@ -103,40 +93,39 @@ def volume_percentile_strategy_backtest(start_date: str = "2020-01-01", end_date
     
     # 获取每月首个交易日
     df['年月'] = df['日期'].dt.to_period('M')
-    monthly_first_days = df.groupby('年月')['日期'].first().reset_index()
-    monthly_first_days['是月初'] = True
-    df = df.merge(monthly_first_days[['日期', '是月初']], on='日期', how='left')
-    df['是月初'] = df['是月初'].fillna(False)
+    # 数据已按日期排序，分组无需再排序；只取数组，不构造DataFrame
+    monthly_first_days = df.groupby('年月', sort=False, observed=True)['日期'].first().values
+    # 直接用成员判断得到布尔列，无需merge和fillna
+    df['是月初'] = df['日期'].isin(monthly_first_days).to_numpy()
     
-    for idx, row in df.iterrows():
-        date = row['日期']
-        price = row['收盘']
-        ma20 = row['MA20']
-        ma60 = row['MA60'] 
-        ma250 = row['MA250']
-        price_percentile = row['价格百分位']
-        volume_percentile = row['成交额_百分位']
-        is_first_day = row['是月初']
+    # 循环前一次性取出所需列，避免逐行构造Series
+    dates = df['日期'].to_numpy()
+    prices = df['收盘'].to_numpy(np.float64)
+    ma20_arr = df['MA20'].to_numpy()
+    ma60_arr = df['MA60'].to_numpy()
+    ma250_arr = df['MA250'].to_numpy()
+    ppct = df['价格百分位'].to_numpy()
+    vpct = df['成交额_百分位'].to_numpy()
+    is_first = df['是月初'].to_numpy(bool)
+    date_keys = df['日期'].dt.strftime('%Y-%m-%d').to_numpy() if macro_signals else None
+    
+    for i in range(len(df)):
+        price = prices[i]
+        ma250 = ma250_arr[i]
         
-        # 计算当前组合价值
-        current_portfolio_value = cash + shares * price + profit_pool
-        portfolio_value.append({
-            '日期': date,
-            '现金': cash,
-            '持股数量': shares,
-            '股票价值': shares * price,
-            '止盈资金池': profit_pool,
-            '组合总价值': current_portfolio_value,
-            '价格百分位': price_percentile,
-            '成交额百分位': volume_percentile,
-            'MA20': ma20,
-            'MA250': ma250
-        })
+        # 记录当前组合状态
+        portfolio_value.append((cash, shares, profit_pool))
         
         # 只在每月首日进行交易
-        if not is_first_day or pd.isna(ma250):
+        if not is_first[i] or np.isnan(ma250):
             continue
         
+        date = pd.Timestamp(dates[i])
+        ma20 = ma20_arr[i]
+        ma60 = ma60_arr[i]
+        price_percentile = ppct[i]
+        volume_percentile = vpct[i]
+        
         # 计算收益率
         if total_invested > 0:
             current_return_rate = ((shares * price + profit_pool) - total_invested) / total_invested
@@ -153,9 +142,8 @@ def volume_percentile_strategy_backtest(start_date: str = "2020-01-01", end_date
         
         # 添加宏观信号（如果启用且有数据）
         macro_signal = 0
-        date_key = date.strftime('%Y-%m-%d')
-        if enable_macro and date_key in macro_signals:
-            macro_data = macro_signals[date_key]
+        if enable_macro and macro_signals and date_keys[i] in macro_signals:
+            macro_data = macro_signals[date_keys[i]]
             macro_signal = macro_data['macro_total_signal']
             signals['macro'] = macro_signal
         
@@ -262,7 +250,20 @@ def volume_percentile_strategy_backtest(start_date: str = "2020-01-01", end_date
             print(f"{date.strftime('%Y-%m-%d')}: {buy_action}, 信号: {total_signal}")
     
     # 转换为DataFrame便于分析
-    portfolio_df = pd.DataFrame(portfolio_value)
+    cash_arr, shares_arr, pool_arr = (np.array(col, dtype=np.float64) for col in zip(*portfolio_value))
+    stock_val_arr = shares_arr * prices
+    portfolio_df = pd.DataFrame({
+        '日期': df['日期'],
+        '现金': cash_arr,
+        '持股数量': shares_arr,
+        '股票价值': stock_val_arr,
+        '止盈资金池': pool_arr,
+        '组合总价值': cash_arr + stock_val_arr + pool_arr,
+        '价格百分位': ppct,
+        '成交额百分位': vpct,
+        'MA20': ma20_arr,
+        'MA250': ma250_arr
+    })
     trades_df = pd.DataFrame(trades) if trades else pd.DataFrame()
     
     # 计算最终收益